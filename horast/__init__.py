@@ -1,10 +1,58 @@
-"""horast: Human-oriented abstract syntax tree parser and unparser."""
+"""horast: Human-oriented abstract syntax tree parser and unparser.
 
-from static_typing import dump
+Members of the package are imported lazily, on first access, so that importing horast is fast.
+Before Python 3.7, which introduced module __getattr__(), they are imported eagerly.
+"""
 
-from .parser import parse
-from .unparser import unparse
+import sys
+import typing as t
 
-from .ast_validator import AstValidator
+if t.TYPE_CHECKING:
+    from static_typing import dump
 
-__all__ = ['dump', 'parse', 'unparse', 'AstValidator']
+    from .parser import parse, parse_file, parse_iter, reparse
+    from .unparser import unparse, iter_unparse, unparse_to
+    from .batch import parse_many
+    from .cache import ParseCache, MemoryCache
+    from .ast_comments import register_directive
+    from .stats import Stats, collect_stats
+
+    from .ast_validator import AstValidator, StdlibAstValidator
+
+__all__ = [
+    'dump', 'parse', 'parse_file', 'parse_iter', 'parse_many', 'reparse',
+    'unparse', 'iter_unparse', 'unparse_to', 'ParseCache', 'MemoryCache',
+    'register_directive', 'Stats', 'collect_stats', 'AstValidator', 'StdlibAstValidator']
+
+_MODULES_OF_MEMBERS = {
+    'dump': 'static_typing',
+    'parse': '.parser', 'parse_file': '.parser', 'parse_iter': '.parser', 'reparse': '.parser',
+    'unparse': '.unparser', 'iter_unparse': '.unparser', 'unparse_to': '.unparser',
+    'parse_many': '.batch',
+    'ParseCache': '.cache', 'MemoryCache': '.cache',
+    'register_directive': '.ast_comments',
+    'Stats': '.stats', 'collect_stats': '.stats',
+    'AstValidator': '.ast_validator', 'StdlibAstValidator': '.ast_validator'}
+
+
+def __getattr__(name: str) -> t.Any:
+    try:
+        module_name = _MODULES_OF_MEMBERS[name]
+    except KeyError:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name)) from None
+    # unlike importlib.import_module(), __import__() is visible in "python -X importtime" output
+    module = __import__(module_name.lstrip('.'), globals(), None, [name],
+                        len(module_name) - len(module_name.lstrip('.')))
+    member = getattr(module, name)
+    globals()[name] = member
+    return member
+
+
+def __dir__() -> t.List[str]:
+    return sorted({*globals(), *__all__})
+
+
+if sys.version_info[:2] < (3, 7):
+    for _name in __all__:
+        __getattr__(_name)
+    del _name
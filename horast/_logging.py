@@ -3,5 +3,11 @@
 import logging
 import os
 
-logging.basicConfig(
-    level=getattr(logging, os.environ.get('LOGGING_LEVEL', 'warning').upper(), logging.WARNING))
+
+def configure_logging() -> None:
+    """Configure logging with level set by LOGGING_LEVEL environment variable.
+
+    Nothing is configured just by importing horast -- this is left to the application.
+    """
+    logging.basicConfig(level=getattr(
+        logging, os.environ.get('LOGGING_LEVEL', 'warning').upper(), logging.WARNING))
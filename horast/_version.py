@@ -1,5 +1,9 @@
-"""Version of horast package."""
+"""Version of horast package.
 
-from version_query import predict_version_str
+It is static, so that it can be read quickly, without inspecting the repository
+or package metadata. When the package is built, setup.py replaces this file with one
+holding the version determined from the git repository, and the version below is used
+only when running from the source tree, or if the repository has no release tags.
+"""
 
-VERSION = predict_version_str()
+VERSION = '0.1.0.dev0'
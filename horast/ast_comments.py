@@ -1,21 +1,32 @@
 """Extract comments from untouched source code and insert them into the AST."""
 
+import ast
+import bisect
 import logging
+import re
+import sys
 import tokenize
 import typing as t
 import warnings
 
 import typed_ast.ast3
-import typed_astunparse
 
 from .nodes import Comment, Directive, Pragma, OpenMpPragma, OpenAccPragma, Include
 from .token_tools import get_token_scope, get_token_locations  # , get_token_scopes
+from .stats import timed, count
 from .ast_tools import \
-    ast_to_list, get_ast_node_locations, find_in_ast, insert_at_path_in_tree, insert_in_tree
+    AST_TYPES, ROOT_TYPES, AstPathNode, ast_to_list, get_ast_node_locations, get_ast_node_scopes, \
+    ScopeIndex, ParentIndex, find_in_ast, insert_at_path_in_tree, insert_all_at_paths_in_tree, \
+    insert_in_tree
 
 _LOG = logging.getLogger(__name__)
 
 CLASSIFIED_NODES = (Include, OpenMpPragma, OpenAccPragma, Pragma, Directive)
+"""Types of directives that comments are classified as by default."""
+
+_DIRECTIVE_TYPES_BY_PREFIX = {}  # type: t.Dict[str, type]
+
+_DIRECTIVE_PREFIX_MATCHER = re.compile(r'(?!)')
 
 
 def is_prefixed(text: str, prefix: str) -> bool:
@@ -33,49 +44,194 @@ def is_prefixed(text: str, prefix: str) -> bool:
     return any(text[len(prefix):].startswith(_) for _ in (' ', '('))
 
 
+def _prefix_trie_pattern(trie: dict) -> str:
+    """Create regular expression matching the longest prefix (as in is_prefixed()) in a trie."""
+    alternatives = [re.escape(char) + _prefix_trie_pattern(subtrie)
+                    for char, subtrie in trie.items() if char]
+    if '' in trie:
+        alternatives.append('' if trie[''].endswith(':') else r'(?=[ (]|\Z)')
+    if len(alternatives) == 1:
+        return alternatives[0]
+    return '(?:{})'.format('|'.join(alternatives))
+
+
+def _compile_directive_prefix_matcher() -> None:
+    global _DIRECTIVE_PREFIX_MATCHER  # pylint: disable=global-statement
+    trie = {}
+    for prefix in _DIRECTIVE_TYPES_BY_PREFIX:
+        subtrie = trie
+        for char in prefix:
+            subtrie = subtrie.setdefault(char, {})
+        subtrie[''] = prefix
+    _DIRECTIVE_PREFIX_MATCHER = re.compile(_prefix_trie_pattern(trie) if trie else r'(?!)')
+
+
+def register_directive(node_type: type) -> type:
+    """Make comments with any of _comment_prefixes of a Directive subclass classified as it.
+
+    If a comment has several registered prefixes, the longest one determines its type.
+    Can be used as a class decorator.
+    """
+    if not isinstance(node_type, type) or not issubclass(node_type, Directive):
+        raise TypeError('{} is not a subclass of {}'.format(node_type, Directive.__name__))
+    prefixes = node_type.__dict__.get('_comment_prefixes')
+    if not prefixes or not all(prefixes):
+        raise ValueError('{} must define non-empty _comment_prefixes, but it has {}'
+                         .format(node_type.__name__, prefixes))
+    for prefix in prefixes:
+        registered_type = _DIRECTIVE_TYPES_BY_PREFIX.get(prefix, node_type)
+        if registered_type is not node_type:
+            raise ValueError('prefix "{}" of {} is already registered for {}'
+                             .format(prefix, node_type.__name__, registered_type.__name__))
+    for prefix in prefixes:
+        _DIRECTIVE_TYPES_BY_PREFIX[prefix] = node_type
+    _compile_directive_prefix_matcher()
+    return node_type
+
+
+def unregister_directive(node_type: type) -> None:
+    """Stop classifying comments as a given directive."""
+    for prefix, registered_type in list(_DIRECTIVE_TYPES_BY_PREFIX.items()):
+        if registered_type is node_type:
+            del _DIRECTIVE_TYPES_BY_PREFIX[prefix]
+    _compile_directive_prefix_matcher()
+
+
+def directive_registry_fingerprint() -> t.Tuple[t.Tuple[str, str], ...]:
+    """List registered prefixes with full names of directive types they are classified as.
+
+    Result changes whenever the registry changes, so it can be used in keys of cached trees.
+    """
+    return tuple(sorted(
+        (prefix, '{}.{}'.format(node_type.__module__, node_type.__qualname__))
+        for prefix, node_type in _DIRECTIVE_TYPES_BY_PREFIX.items()))
+
+
+for _ in CLASSIFIED_NODES:
+    register_directive(_)
+
+
 def classify_comment_token(token: tokenize.TokenInfo) -> type:
-    # for node_type, prefixes in PREFIXES:
-    for node_type in CLASSIFIED_NODES:
-        # for prefix in prefixes:
-        for prefix in getattr(node_type, '_comment_prefixes', ()):
-            if is_prefixed(token.string[1:], prefix):
-                _LOG.debug('classified "%s" as %s (prefix: %s)', token.string, node_type, prefix)
-                return node_type
-    _LOG.debug('classified "%s" as %s', token.string, Comment)
-    return Comment
-
-
-def insert_comment_token(token: tokenize.TokenInfo, code, tree, nodes=None):
+    match = _DIRECTIVE_PREFIX_MATCHER.match(token.string, 1)
+    if match is None:
+        _LOG.debug('classified "%s" as %s', token.string, Comment)
+        return Comment
+    node_type = _DIRECTIVE_TYPES_BY_PREFIX[match.group()]
+    _LOG.debug('classified "%s" as %s (prefix: %s)', token.string, node_type, match.group())
+    return node_type
+
+
+def comment_token_to_node(
+        token: tokenize.TokenInfo, path_to_anchor, before_anchor) -> typed_ast.ast3.AST:
+    """Create a Comment or Directive node from a comment token anchored at a given location."""
+    node_type = classify_comment_token(token)
+    if issubclass(node_type, Comment):
+        return node_type.from_token(token, path_to_anchor, before_anchor)
+    if issubclass(node_type, Directive):
+        return node_type.from_token(token)
+    raise ValueError('insertion of node {} (from token "{}") is not supported'
+                     .format(node_type.__name__, token))
+
+
+def insert_comment_token(
+        token: tokenize.TokenInfo, code, tree, nodes=None, scope_index: ScopeIndex = None,
+        parent_index: ParentIndex = None):
     if nodes is None:
         # this is time consuming, so providing list of nodes is encouraged
         nodes = ast_to_list(tree)
+    if scope_index is None:
+        # this is even more time consuming, so providing index of scopes is strongly encouraged
+        scope_index = ScopeIndex(nodes, get_ast_node_scopes(code, nodes))
     scope = get_token_scope(token)
-    path_to_anchor, before_anchor = find_in_ast(code, tree, nodes, scope)
-    node_type = classify_comment_token(token)
-    if issubclass(node_type, Comment):
-        node = node_type.from_token(token, path_to_anchor, before_anchor)
-    else:
-        if issubclass(node_type, Directive):
-            node = node_type.from_token(token)
-        else:
-            raise ValueError('insertion of node {} (from token "{}") is not supported'
-                             .format(node_type.__name__, token))
-
+    path_to_anchor, before_anchor = find_in_ast(
+        code, tree, nodes, scope, scope_index, parent_index)
+    node = comment_token_to_node(token, path_to_anchor, before_anchor)
     _LOG.debug('inserting a %s: %s %s %s', type(node).__name__, node,
                'before' if before_anchor else 'after', path_to_anchor[-1])
-    return insert_at_path_in_tree(tree, node, path_to_anchor, before_anchor)
+    return insert_at_path_in_tree(tree, node, path_to_anchor, before_anchor, parent_index)
 
 
 def insert_comment_tokens(
-        code: str, tree: typed_ast.ast3.AST,
-        tokens: t.List[tokenize.TokenInfo]) -> typed_ast.ast3.AST:
-    """Insert comment tokens into an AST obtained from typed_ast parser."""
-    assert isinstance(tree, typed_ast.ast3.AST)
+        code: str, tree: typed_ast.ast3.AST, tokens: t.List[tokenize.TokenInfo],
+        bulk: bool = True, code_tokens: t.List[tokenize.TokenInfo] = None) -> typed_ast.ast3.AST:
+    """Insert comment tokens into an AST obtained from typed_ast or built-in ast parser.
+
+    Scopes and parents of all nodes are indexed only once, before any comment is inserted.
+    If all tokens of the code are provided, they are reused instead of tokenizing the code again.
+
+    By default, all comments are anchored in the unmodified AST first, and then merged into it
+    in a single pass. If bulk is False, comments are inserted one by one instead.
+    """
+    assert isinstance(tree, AST_TYPES), type(tree)
     assert isinstance(tokens, list)
-    nodes = ast_to_list(tree)
+    if not tokens:
+        return tree
+    with timed('ast_to_list'):
+        nodes = ast_to_list(tree)
+    count('nodes', len(nodes))
+    with timed('get_ast_node_scopes'):
+        scopes = get_ast_node_scopes(code, nodes, code_tokens)
+    with timed('index'):
+        scope_index = ScopeIndex(nodes, scopes)
+        parent_index = ParentIndex(tree)
+    if not bulk:
+        for token in tokens:
+            tree = insert_comment_token(token, code, tree, nodes, scope_index, parent_index)
+        return tree
+    insertions = []
+    with timed('find_in_ast'):
+        for token in tokens:
+            path_to_anchor, before_anchor = find_in_ast(
+                code, tree, nodes, get_token_scope(token), scope_index, parent_index)
+            node = comment_token_to_node(token, path_to_anchor, before_anchor)
+            insertions.append((node, path_to_anchor, before_anchor))
+    with timed('insert'):
+        return insert_all_at_paths_in_tree(tree, insertions)
+
+
+def are_module_level_comment_tokens(tree: ast.AST, tokens: t.List[tokenize.TokenInfo]) -> bool:
+    """Check if all comment tokens are full-line comments between top-level statements.
+
+    This works for AST created by the built-in ast parser, because it relies on end positions
+    of top-level statements. For other AST, see has_only_module_level_comments().
+    """
+    assert isinstance(tree, ROOT_TYPES), type(tree)
+    first_linenos = [
+        statement.decorator_list[0].lineno if getattr(statement, 'decorator_list', None)
+        else statement.lineno for statement in tree.body]
+    end_linenos = [statement.end_lineno for statement in tree.body]
     for token in tokens:
-        tree = insert_comment_token(token, code, tree, nodes)
-    return tree
+        lineno, col_offset = token.start
+        if token.line[:col_offset].strip():
+            return False
+        index = bisect.bisect_right(first_linenos, lineno) - 1
+        if index >= 0 and end_linenos[index] >= lineno:
+            return False
+    return True
+
+
+def insert_module_level_comment_tokens(
+        tree: typed_ast.ast3.AST, tokens: t.List[tokenize.TokenInfo]) -> typed_ast.ast3.AST:
+    """Insert full-line comment tokens that are between top-level statements into an AST.
+
+    Only line numbers of top-level statements are used to place the comments, therefore
+    it is up to the caller to make sure that the comments are indeed between them,
+    e.g. via has_only_module_level_comments().
+
+    The result is the same as from insert_comment_tokens().
+    """
+    assert isinstance(tree, ROOT_TYPES), type(tree)
+    assert isinstance(tokens, list)
+    body = tree.body
+    statement_linenos = [statement.lineno for statement in body]
+    insertions = []
+    for token in tokens:
+        index = bisect.bisect_left(statement_linenos, token.start[0])
+        before_anchor = index < len(body) or not body
+        path_to_anchor = [AstPathNode(tree, 'body', index if before_anchor else index - 1)]
+        node = comment_token_to_node(token, path_to_anchor, before_anchor)
+        insertions.append((node, path_to_anchor, before_anchor))
+    return insert_all_at_paths_in_tree(tree, insertions)
 
 
 def insert_comment_tokens_approx(
@@ -128,12 +284,16 @@ def insert_comment_tokens_approx(
         tokens_eol_status.append(eol_comment_here)
         token_insertion_indices.append(node_index)
     _LOG.debug('token insertion indices: %s', token_insertion_indices)
-    _LOG.debug('tree before insertion:\n"""\n%s\n"""', typed_astunparse.dump(tree))
-    _LOG.debug('code before insertion:\n"""\n%s\n"""', typed_astunparse.unparse(tree).strip())
+    debug = _LOG.isEnabledFor(logging.DEBUG)
+    if debug:
+        import typed_astunparse  # importing it is slow, so it's done only if needed
+        _LOG.debug('tree before insertion:\n"""\n%s\n"""', typed_astunparse.dump(tree))
+        _LOG.debug('code before insertion:\n"""\n%s\n"""',
+                   typed_astunparse.unparse(tree).strip())
     for token_index, token_insertion_index in reversed(list(enumerate(token_insertion_indices))):
         token = tokens[token_index]
         eol = tokens_eol_status[token_index]
-        comment = Comment(token.string[1:], eol)
+        comment = Comment(sys.intern(token.string[1:]), eol)
         if token_insertion_index == 0:
             anchor = nodes[token_insertion_index]
             before_anchor = True
@@ -145,6 +305,7 @@ def insert_comment_tokens_approx(
             before_anchor = False
         _LOG.debug('inserting %s %s %s', comment, 'before' if before_anchor else 'after', anchor)
         tree = insert_in_tree(tree, comment, anchor=anchor, before_anchor=before_anchor)
-    _LOG.debug('tree after insertion:\n"""\n%s\n"""', typed_astunparse.dump(tree))
+    if debug:
+        _LOG.debug('tree after insertion:\n"""\n%s\n"""', typed_astunparse.dump(tree))
     # _LOG.warning('code after insertion:\n"""\n%s\n"""', typed_astunparse.unparse(tree).strip())
     return tree
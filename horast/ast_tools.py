@@ -1,18 +1,27 @@
 """Various helper functions to query and manipulate AST."""
 
+import array
 import ast
+import bisect
 import logging
-import re
+import tokenize
+import types
 import typing as t
 
-import asttokens
-from static_typing.ast_manipulation import RecursiveAstVisitor
 import typed_ast.ast3
 
-from .token_tools import Scope
+from .token_tools import Scope, LineIndex
+from .token_marker import EMPTY_SCOPE, TokenMarker
+from .stats import timed, count
 
 _LOG = logging.getLogger(__name__)
 
+AST_TYPES = (typed_ast.ast3.AST, ast.AST)
+"""Base classes of AST nodes created by the supported parser backends."""
+
+ROOT_TYPES = (typed_ast.ast3.Module, typed_ast.ast3.Interactive, ast.Module, ast.Interactive)
+"""Classes of AST roots into whose body comments can be inserted."""
+
 AstPathNode = t.NamedTuple('AstPathNode', [
     ('node', typed_ast.ast3.AST), ('field', t.Optional[str]), ('index', t.Optional[int])])
 """Node on a AST path.
@@ -24,20 +33,48 @@ Meaning of fields:
 """
 
 
+def ast_module_of(node: typed_ast.ast3.AST) -> types.ModuleType:
+    """Determine the AST module (typed_ast.ast3 or ast) which defines a given node."""
+    return typed_ast.ast3 if isinstance(node, typed_ast.ast3.AST) else ast
+
+
 def ast_to_list(
         tree: typed_ast.ast3.AST, only_localizable: bool = False) -> t.List[typed_ast.ast3.AST]:
-    """Generate a flat list of nodes in AST."""
+    """Generate a flat list of nodes in AST, in depth-first pre-order."""
     nodes = []
-
-    class Visitor(RecursiveAstVisitor[typed_ast.ast3]):
-        def visit_node(self, node):
-            if not only_localizable or hasattr(node, 'lineno') and hasattr(node, 'col_offset'):
-                nodes.append(node)
-    visitor = Visitor()
-    visitor.visit(tree)
+    stack = [tree]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, list):
+            stack += reversed(value)
+        elif hasattr(value, '_fields') and not isinstance(value, (str, tuple)):
+            if not only_localizable or hasattr(value, 'lineno') and hasattr(value, 'col_offset'):
+                nodes.append(value)
+            stack += reversed([_ for __, _ in typed_ast.ast3.iter_fields(value)])
     return nodes
 
 
+def increment_lineno(tree: typed_ast.ast3.AST, offset: int) -> typed_ast.ast3.AST:
+    """Increment line numbers (including end line numbers) of all nodes in AST by given offset.
+
+    Unlike increment_lineno() from typed_ast.ast3 or ast module, this works for AST of either
+    module and also for Comment and Directive nodes.
+    """
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if getattr(node, 'lineno', None) is not None:
+            node.lineno += offset
+        if getattr(node, 'end_lineno', None) is not None:
+            node.end_lineno += offset
+        for _, field_value in typed_ast.ast3.iter_fields(node):
+            if isinstance(field_value, list):
+                stack += [_ for _ in field_value if isinstance(_, AST_TYPES)]
+            elif isinstance(field_value, AST_TYPES):
+                stack.append(field_value)
+    return tree
+
+
 def get_ast_node_locations(nodes: t.List[typed_ast.ast3.AST]) -> t.List[t.Tuple[int, int]]:
     return [(
         node.lineno if hasattr(node, 'lineno') else None,
@@ -46,67 +83,200 @@ def get_ast_node_locations(nodes: t.List[typed_ast.ast3.AST]) -> t.List[t.Tuple[
 
 def convert_1d_str_index_to_2d(
         text: str, index: int, line_separator: str = '\n',
-        newline_starts: t.List[int] = None) -> t.Tuple[int, int]:
-    """Convert 1D index in text to tuple (lineno, col_offset)."""
+        newline_starts: t.List[int] = None, line_index: LineIndex = None) -> t.Tuple[int, int]:
+    """Convert 1D index in text to tuple (lineno, col_offset).
+
+    When converting many indices in the same text, providing its line index is encouraged.
+    """
     assert isinstance(text, str), type(text)
     assert isinstance(index, int), type(index)
-    if newline_starts is None:
-        newline_starts = [m.end() for m in re.finditer(line_separator, text)]
-    if index < 0 or index > len(text):
-        raise ValueError('index={} is outside [0,{}]'.format(index, len(text)))
-    lineno = 1
-    for newline_start in newline_starts:
-        if newline_start > index:
-            break
-        lineno += 1
-    col_offset = index
-    if newline_starts and lineno > 1:
-        col_offset -= newline_starts[lineno - 2]
-    _LOG.debug('converted %s[%i] into (%i, %i)', repr(text), index, lineno, col_offset)
+    if line_index is None:
+        line_index = LineIndex(text, line_separator, newline_starts)
+    lineno, col_offset = line_index.to_2d(index)
+    _LOG.debug('converted %r[%i] into (%i, %i)', text, index, lineno, col_offset)
     return lineno, col_offset
 
 
-def get_ast_node_scopes(code: str, nodes: t.List[typed_ast.ast3.AST]) -> t.List[Scope]:
-    atok = asttokens.ASTTokens(code, tree=ast.parse(code))
-    ast_nodes = ast_to_list(atok.tree)
-    assert len(ast_nodes) == len(nodes), (len(ast_nodes), len(nodes))
-    newline_starts = [m.end() for m in re.finditer('\n', code)]
-    _LOG.debug('new lines in code: %s', newline_starts)
-    scopes = []
-    _LOG.debug('marked %i nodes:', len(ast_nodes))
-    for node in ast_nodes:
-        raw_node_scope = atok.get_text_range(node)
-        _LOG.debug(
-            'node %s at %s: code="""%s""", tree=%s',
-            type(node).__name__, raw_node_scope, atok.get_text(node), ast.dump(node))
-        node_scope = Scope(*[
-            convert_1d_str_index_to_2d(code, _, newline_starts=newline_starts)
-            for _ in raw_node_scope])
-        _LOG.debug('scope %s is %s', raw_node_scope, node_scope)
-        scopes.append(node_scope)
+def get_ast_node_scopes(
+        code: str, nodes: t.List[typed_ast.ast3.AST],
+        tokens: t.List[tokenize.TokenInfo] = None) -> t.List[Scope]:
+    """Find scope of each of the nodes in the code.
+
+    The first of the nodes must be the root of the AST, as in the result of ast_to_list().
+    The scopes are derived directly from that AST, without parsing the code again.
+
+    All tokens of the code (as generated by tokenize.generate_tokens) can be provided
+    to avoid tokenizing the code again.
+
+    If the AST was created by the built-in ast parser, end positions recorded in the nodes are
+    used instead of tokens.
+    """
+    if ast_module_of(nodes[0]) is ast:
+        return get_ast_node_scopes_from_positions(code, nodes)
+    if tokens is None:
+        count('tokenizations')
+    marker = TokenMarker(code, tokens)
+    count('token_marker_builds')
+    marker.mark(nodes[0])
+    scopes = [marker.scope(node) for node in nodes]
+    if _LOG.isEnabledFor(logging.DEBUG):
+        _LOG.debug('marked %i nodes:', len(nodes))
+        for node, node_scope in zip(nodes, scopes):
+            _LOG.debug('node %s is at %s', type(node).__name__, node_scope)
+    return scopes
+
+
+def get_ast_node_scopes_from_positions(
+        code: str, nodes: t.List[ast.AST], line_index: LineIndex = None) -> t.List[Scope]:
+    """Find scope of each of the nodes in the code, using positions stored in the nodes.
+
+    This works for AST created by the built-in ast parser (which records end positions),
+    and the first of the nodes must be the root of the AST, as in the result of ast_to_list().
+
+    Nodes without positions span all their children, except for the root which (just like in
+    the TokenMarker) starts at the beginning of the code. Expression contexts, operators
+    and contents of f-strings are given an empty scope.
+    """
+    if line_index is None:
+        line_index = LineIndex(code)
+    utf8_to_col = line_index.utf8_to_col
+    node_scopes = {}  # type: t.Dict[int, Scope]
+    stack = [(nodes[0], False)]
+    while stack:
+        node, children_done = stack.pop()
+        if not children_done:
+            stack.append((node, True))
+            if not isinstance(node, ast.JoinedStr):
+                stack += [(child, False) for child in ast.iter_child_nodes(node)]
+            continue
+        end_lineno = getattr(node, 'end_lineno', None)
+        if end_lineno is not None:
+            start = (node.lineno, utf8_to_col(node.lineno, node.col_offset))
+            if getattr(node, 'decorator_list', None):
+                # like in typed_ast, decorated definition starts at "@" of its first decorator
+                decorator_start = node_scopes[id(node.decorator_list[0])].start
+                start = (decorator_start[0], line_index.line(decorator_start[0]).rindex(
+                    '@', 0, decorator_start[1]))
+            node_scopes[id(node)] = Scope(
+                start, (end_lineno, utf8_to_col(end_lineno, node.end_col_offset)))
+            continue
+        child_scopes = [
+            node_scopes[id(child)] for child in ast.iter_child_nodes(node)
+            if node_scopes.get(id(child), EMPTY_SCOPE) is not EMPTY_SCOPE]
+        if child_scopes:
+            node_scopes[id(node)] = Scope(
+                min(_.start for _ in child_scopes), max(_.end for _ in child_scopes))
+    root_scope = node_scopes.get(id(nodes[0]))
+    if root_scope is not None and getattr(nodes[0], 'end_lineno', None) is None:
+        node_scopes[id(nodes[0])] = Scope((1, 0), root_scope.end)
+    scopes = [node_scopes.get(id(node), EMPTY_SCOPE) for node in nodes]
+    _LOG.debug('found scopes of %i nodes', len(nodes))
     return scopes
 
 
+class ParentIndex:
+
+    """Map each node in AST to its parent, built in one pass over the tree.
+
+    For each node, the index stores an AstPathNode of its parent, i.e. the parent node,
+    the name of the field in which the node is and its index in that field (if it's a list).
+
+    The index stays valid as long as new nodes are inserted via its insert() method.
+
+    A node object reachable from several places in the tree (e.g. a shared expression context)
+    is mapped to the last place in which it was found.
+    """
+
+    def __init__(self, tree: typed_ast.ast3.AST):
+        assert isinstance(tree, AST_TYPES), type(tree)
+        self.tree = tree
+        self._parents = {}  # type: t.Dict[int, AstPathNode]
+        self._add_subtree(tree)
+
+    def _add_subtree(self, subtree: typed_ast.ast3.AST) -> None:
+        parents = self._parents
+        stack = [subtree]
+        while stack:
+            node = stack.pop()
+            for field_name, field_value in typed_ast.ast3.iter_fields(node):
+                if isinstance(field_value, list):
+                    for i, field_value_elem in enumerate(field_value):
+                        if isinstance(field_value_elem, AST_TYPES):
+                            parents[id(field_value_elem)] = AstPathNode(node, field_name, i)
+                            stack.append(field_value_elem)
+                elif isinstance(field_value, AST_TYPES):
+                    parents[id(field_value)] = AstPathNode(node, field_name, None)
+                    stack.append(field_value)
+
+    def __contains__(self, node: typed_ast.ast3.AST) -> bool:
+        return node is self.tree or id(node) in self._parents
+
+    def parent(self, node: typed_ast.ast3.AST) -> t.Optional[AstPathNode]:
+        """Get parent of a given node, or None if the node is the root of the tree."""
+        if node is self.tree:
+            return None
+        try:
+            return self._parents[id(node)]
+        except KeyError as err:
+            raise ValueError('node {} not found in AST {}'.format(node, self.tree)) from err
+
+    def path(self, target_node: typed_ast.ast3.AST) -> t.List[AstPathNode]:
+        """Find path to node in the indexed AST, in time proportional to the depth of the node."""
+        node_path = [AstPathNode(target_node, None, None)]
+        parent = self.parent(target_node)
+        while parent is not None:
+            node_path.append(parent)
+            parent = self.parent(parent.node)
+        return list(reversed(node_path))
+
+    def insert(self, parent: typed_ast.ast3.AST, field: str, index: int,
+               inserted: typed_ast.ast3.AST) -> None:
+        """Insert a new node into a list field of a given node and update the index accordingly."""
+        getattr(parent, field).insert(index, inserted)
+        self.update(parent, field, [inserted], index)
+
+    def update(self, parent: typed_ast.ast3.AST, field: str,
+               inserted: t.Iterable[typed_ast.ast3.AST] = (), start: int = 0) -> None:
+        """Update the index after nodes were inserted into a list field of a given node.
+
+        Only elements of the list from the given start index onwards are reindexed.
+        """
+        field_value = getattr(parent, field)
+        for i in range(start, len(field_value)):
+            self._parents[id(field_value[i])] = AstPathNode(parent, field, i)
+        for node in inserted:
+            self._add_subtree(node)
+
+
 def node_path_in_ast(
-        tree: typed_ast.ast3.AST,
-        target_node: typed_ast.ast3.AST) -> t.List[AstPathNode]:
+        tree: typed_ast.ast3.AST, target_node: typed_ast.ast3.AST,
+        parent_index: ParentIndex = None) -> t.List[AstPathNode]:
     """Find path to node in the given AST.
 
     Return a list of AstPathNode from root node up to the target node.
+
+    When looking for many nodes in the same AST, providing its parent index is encouraged.
     """
-    assert isinstance(tree, typed_ast.ast3.AST), type(tree)
-    assert isinstance(target_node, typed_ast.ast3.AST), type(target_node)
-    _LOG.debug('looking for node: %s', typed_ast.ast3.dump(target_node, include_attributes=True))
+    assert isinstance(tree, AST_TYPES), type(tree)
+    assert isinstance(target_node, AST_TYPES), type(target_node)
+    if _LOG.isEnabledFor(logging.DEBUG):
+        _LOG.debug('looking for node: %s', ast_module_of(target_node).dump(
+            target_node, include_attributes=True))
+    if parent_index is not None:
+        assert parent_index.tree is tree
+        return parent_index.path(target_node)
     nodes = ast_to_list(tree)
     nodes = nodes[:nodes.index(target_node) + 1]
     node_path = [AstPathNode(target_node, None, None)]
+    debug = _LOG.isEnabledFor(logging.DEBUG)
     current_anchor = target_node
     reversed_anchor_index = 0
     reversed_nodes = list(reversed(list(enumerate(nodes))))
     while current_anchor is not nodes[0]:
         reversed_anchor_index += 1
         for index, node in reversed_nodes[reversed_anchor_index:]:
-            _LOG.debug('nodes[%i] is %s', index, node)
+            if debug:
+                _LOG.debug('nodes[%i] is %s', index, node)
             for field_name, field_value in typed_ast.ast3.iter_fields(node):
                 if field_value is None or isinstance(field_value, (int, float, str, type, tuple)):
                     continue
@@ -118,7 +288,9 @@ def node_path_in_ast(
                             reversed_anchor_index += index
                             node_path.append(AstPathNode(node, field_name, i))
                             found = True
-                            _LOG.debug('"%s[%i]" of %s is on the path', field_name, i, node)
+                            if debug:
+                                _LOG.debug(
+                                    '"%s[%i]" of %s is on the path', field_name, i, node)
                             break
                     if found:
                         break
@@ -127,88 +299,136 @@ def node_path_in_ast(
                     current_anchor = node
                     reversed_anchor_index += index
                     node_path.append(AstPathNode(node, field_name, None))
-                    _LOG.debug('"%s" of %s is on the path', field_name, node)
+                    if debug:
+                        _LOG.debug('"%s" of %s is on the path', field_name, node)
                     break
     return list(reversed(node_path))
 
 
+def _pack_position(position: t.Tuple[int, int]) -> int:
+    """Pack (lineno, col_offset) into a single integer that preserves the ordering of positions."""
+    lineno, col_offset = position
+    return (lineno << 32) + col_offset
+
+
+class ScopeIndex:
+
+    """Sorted index of scopes of AST nodes, meant to anchor many comments in the same AST.
+
+    Scopes are stored as arrays of packed positions, sorted once by start (outermost first
+    on ties) and once by end, and all queries are answered via bisection.
+
+    Each query returns an index into the list of nodes given at construction, or None.
+    """
+
+    def __init__(self, nodes: t.List[typed_ast.ast3.AST], scopes: t.List[Scope]):
+        assert len(nodes) == len(scopes), (len(nodes), len(scopes))
+        self.nodes = nodes
+        by_start = sorted(range(len(scopes)), key=lambda _: (
+            _pack_position(scopes[_].start), -_pack_position(scopes[_].end)))
+        self.order_by_start = array.array('l', by_start)
+        self.starts = array.array('q', (_pack_position(scopes[_].start) for _ in by_start))
+        self.ends = array.array('q', (_pack_position(scopes[_].end) for _ in by_start))
+        by_end = sorted(range(len(scopes)), key=lambda _: (
+            _pack_position(scopes[_].end), -_pack_position(scopes[_].start)))
+        self.order_by_end = array.array('l', by_end)
+        self.sorted_ends = array.array('q', (_pack_position(scopes[_].end) for _ in by_end))
+        self.enclosing = self._find_enclosing(self.ends)
+
+    @staticmethod
+    def _find_enclosing(ends: t.Sequence[int]) -> array.array:
+        """For each scope sorted by start, find the nearest preceding one that ends no earlier.
+
+        Following these links from any scope visits all its potential containers, innermost first.
+        """
+        enclosing = array.array('l', [-1] * len(ends))
+        stack = []  # type: t.List[int]
+        for i, end in enumerate(ends):
+            while stack and ends[stack[-1]] < end:
+                stack.pop()
+            if stack:
+                enclosing[i] = stack[-1]
+            stack.append(i)
+        return enclosing
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def first_after(self, position: t.Tuple[int, int]) -> t.Optional[int]:
+        """Find the first node (outermost on ties) that starts after the given position."""
+        i = bisect.bisect_right(self.starts, _pack_position(position))
+        if i == len(self.starts):
+            return None
+        return self.order_by_start[i]
+
+    def last_before(self, position: t.Tuple[int, int]) -> t.Optional[int]:
+        """Find the last node that ends before the given position."""
+        i = bisect.bisect_left(self.sorted_ends, _pack_position(position))
+        if i == 0:
+            return None
+        return self.order_by_end[i - 1]
+
+    def innermost_container(self, scope: Scope) -> t.Optional[int]:
+        """Find the innermost node that starts no later and ends after the given scope."""
+        end = _pack_position(scope.end)
+        i = bisect.bisect_right(self.starts, _pack_position(scope.start)) - 1
+        while i >= 0:
+            if self.ends[i] > end:
+                return self.order_by_start[i]
+            i = self.enclosing[i]
+        return None
+
+
 def find_in_ast(
         code: str, tree: typed_ast.ast3.AST, nodes: t.List[typed_ast.ast3.AST],
-        scope: Scope) -> t.Tuple[t.List[AstPathNode], bool]:
+        scope: Scope, scope_index: ScopeIndex = None,
+        parent_index: ParentIndex = None) -> t.Tuple[t.List[AstPathNode], bool]:
     """Return tuple: (path, before).
 
     Where:
     - path is path to the anchor node for the target scope
     - before is boolean flag set to True if target scope is before the anchor node, False otherwise
+
+    Scopes of nodes are computed from the code if their index is not provided.
     """
-    scopes = get_ast_node_scopes(code, nodes)
-    assert len(nodes) == len(scopes), (len(nodes), len(scopes))
-    node_scopes_by_start = list(zip(nodes, scopes))
-    node_scopes_by_start.sort(key=lambda _: _[1].end, reverse=True)
-    node_scopes_by_start.sort(key=lambda _: _[1].start)
-    _LOG.debug('by start: %s', node_scopes_by_start)
-    node_scopes_by_end = list(zip(nodes, scopes))
-    node_scopes_by_end.sort(key=lambda _: _[1].start, reverse=True)
-    node_scopes_by_end.sort(key=lambda _: _[1].end)
-    _LOG.debug('by end: %s', node_scopes_by_end)
+    if scope_index is None:
+        # this is time consuming, so providing index of scopes is encouraged
+        scope_index = ScopeIndex(nodes, get_ast_node_scopes(code, nodes))
+    assert len(nodes) == len(scope_index), (len(nodes), len(scope_index))
     target_scope = scope
-    _LOG.debug('the target scope %s', target_scope)
-
-    node_by_end_after_index = None
-    for i, (node, scope_) in enumerate(node_scopes_by_end):
-        if target_scope.start > scope_.end:
-            node_by_end_after_index = i
-            _LOG.debug('is after node %s at %s', node, scope_)
-            break
-    if node_by_end_after_index is None:
-        _LOG.debug('is not after any node')
-
-    node_by_start_before_index = None
-    for i, (node, scope_) in enumerate(node_scopes_by_start):
-        if target_scope.end < scope_.start:
-            node_by_start_before_index = i
-            _LOG.debug('is before node %s at %s', node, scope_)
-            break
-    if node_by_start_before_index is None:
-        _LOG.debug('is not before any node')
-
-    scopes_containing_target_scope = []
-    for i, (node, scope_) in enumerate(node_scopes_by_start):
-        if scope_.start > target_scope.start:
-            break
-        if scope_.end > target_scope.end:
-            scopes_containing_target_scope.append((node, scope_))
-    _LOG.debug('is within nodes %s', scopes_containing_target_scope)
-
-    if node_by_end_after_index is None:
+    after_index = scope_index.last_before(target_scope.start)
+    before_index = scope_index.first_after(target_scope.end)
+    within_index = scope_index.innermost_container(target_scope)
+    if _LOG.isEnabledFor(logging.DEBUG):
+        _LOG.debug(
+            'the target scope %s is after node %s, before node %s and within node %s',
+            target_scope, *[None if _ is None else nodes[_]
+                            for _ in (after_index, before_index, within_index)])
+
+    if after_index is None:
         _LOG.debug('target %s is before first node', target_scope)
-        assert isinstance(nodes[0], (typed_ast.ast3.Module, typed_ast.ast3.Interactive)), \
-            type(nodes[0])
+        assert isinstance(nodes[0], ROOT_TYPES), type(nodes[0])
         return ([AstPathNode(nodes[0], 'body', 0)], True)
 
-    if node_by_start_before_index is None and not scopes_containing_target_scope:
+    if before_index is None and within_index is None:
         _LOG.debug('target %s is after last node', target_scope)
-        assert isinstance(nodes[0], (typed_ast.ast3.Module, typed_ast.ast3.Interactive)), \
-            type(nodes[0])
-        assert len(nodes[0].body) > 0
+        assert isinstance(nodes[0], ROOT_TYPES), type(nodes[0])
+        if not nodes[0].body:
+            return ([AstPathNode(nodes[0], 'body', 0)], True)
         return ([AstPathNode(nodes[0], 'body', len(nodes[0].body) - 1)], False)
-    elif node_by_start_before_index is None or not scopes_containing_target_scope:
+    elif before_index is None or within_index is None:
         raise NotImplementedError(
             'inconsistent results for target {} in:\n"""\n{}\nafter {}, before {}, within {}"""'
-            .format(target_scope, code, node_by_end_after_index, node_by_start_before_index,
-                    scopes_containing_target_scope))
+            .format(target_scope, code, after_index, before_index, within_index))
 
-    assert node_by_end_after_index is not None
-    assert node_by_start_before_index is not None
-    assert scopes_containing_target_scope
     _LOG.debug(
         'target %s is neither before first node nor after last node in:\n"""\n%s\n"""'
-        '\nbut between %s and %s, within %s',
-        target_scope, code, node_scopes_by_end[node_by_end_after_index],
-        node_scopes_by_start[node_by_start_before_index], scopes_containing_target_scope)
-    within_node, _ = scopes_containing_target_scope[-1]
-    before_node, _ = node_scopes_by_start[node_by_start_before_index]
-    path = node_path_in_ast(tree, before_node)
+        '\nbut between %s and %s, within %s', target_scope, code,
+        nodes[after_index], nodes[before_index], nodes[within_index])
+    within_node = nodes[within_index]
+    before_node = nodes[before_index]
+    with timed('node_path_in_ast'):
+        path = node_path_in_ast(tree, before_node, parent_index)
     assert len(path) >= 2, path
     assert path[-2].node is within_node, (path[-2].node, within_node)
     return (path[:-1], True)
@@ -216,30 +436,84 @@ def find_in_ast(
 
 def insert_at_path_in_tree(
         tree: typed_ast.ast3.AST, inserted: typed_ast.ast3.AST,
-        path_to_anchor: t.Sequence[AstPathNode],
-        before_anchor: bool = False) -> typed_ast.ast3.AST:
-    """Insert a new AST node into an existing AST at exactly specified location."""
-    assert isinstance(tree, typed_ast.ast3.AST), type(tree)
-    assert isinstance(inserted, typed_ast.ast3.AST), type(inserted)
-    # assert isinstance(anchor, typed_ast.ast3.AST), type(anchor)
+        path_to_anchor: t.Sequence[AstPathNode], before_anchor: bool = False,
+        parent_index: ParentIndex = None) -> typed_ast.ast3.AST:
+    """Insert a new AST node into an existing AST at exactly specified location.
+
+    If parent index of the AST is provided, it is updated as well.
+    """
+    assert isinstance(tree, AST_TYPES), type(tree)
+    assert isinstance(inserted, AST_TYPES), type(inserted)
+    # assert isinstance(anchor, AST_TYPES), type(anchor)
     parent, field, index = path_to_anchor[-1]
     if not before_anchor:
         index += 1
-    getattr(parent, field).insert(index, inserted)
+    if parent_index is None:
+        getattr(parent, field).insert(index, inserted)
+    else:
+        parent_index.insert(parent, field, index, inserted)
+    return tree
+
+
+def insert_all_at_paths_in_tree(
+        tree: typed_ast.ast3.AST,
+        insertions: t.Iterable[t.Tuple[typed_ast.ast3.AST, t.Sequence[AstPathNode], bool]],
+        parent_index: ParentIndex = None) -> typed_ast.ast3.AST:
+    """Insert many new AST nodes into an existing AST at exactly specified locations.
+
+    Each insertion is a tuple (inserted, path_to_anchor, before_anchor), as in
+    insert_at_path_in_tree(), but all paths are relative to the AST before any insertion.
+
+    Insertions are grouped by the list into which they are made, and each such list is rebuilt
+    only once by merging. Nodes inserted at the same location retain their relative order.
+
+    If parent index of the AST is provided, it is updated as well.
+    """
+    assert isinstance(tree, AST_TYPES), type(tree)
+    groups = {}  # type: t.Dict[t.Tuple[int, str], t.Tuple[typed_ast.ast3.AST, str, list]]
+    for order, (inserted, path_to_anchor, before_anchor) in enumerate(insertions):
+        assert isinstance(inserted, AST_TYPES), type(inserted)
+        parent, field, index = path_to_anchor[-1]
+        if index is None:
+            raise NotImplementedError('cannot insert {} into a non-list field "{}" of {}'
+                                      .format(inserted, field, parent))
+        if not before_anchor:
+            index += 1
+        key = (id(parent), field)
+        if key not in groups:
+            groups[key] = (parent, field, [])
+        groups[key][2].append((index, order, inserted))
+    for parent, field, group in groups.values():
+        group.sort(key=lambda _: _[:2])
+        field_value = getattr(parent, field)
+        merged = []
+        merged_until = 0
+        for index, _, inserted in group:
+            merged += field_value[merged_until:index]
+            merged_until = max(merged_until, index)
+            merged.append(inserted)
+        merged += field_value[merged_until:]
+        field_value[:] = merged
+        if parent_index is not None:
+            parent_index.update(
+                parent, field, [inserted for _, _, inserted in group], group[0][0])
     return tree
 
 
 def insert_in_tree(
         tree: typed_ast.ast3.AST, inserted: typed_ast.ast3.AST, anchor: typed_ast.ast3.AST,
-        before_anchor: bool = False, strict: bool = False) -> typed_ast.ast3.AST:
+        before_anchor: bool = False, strict: bool = False,
+        parent_index: ParentIndex = None) -> typed_ast.ast3.AST:
     """Insert a new AST node into an existing AST near the anchor node.
 
     Try to maintain correctness after insertion.
+
+    If parent index of the AST is provided, it is used to find the anchor and updated as well.
     """
-    assert isinstance(tree, typed_ast.ast3.AST), type(tree)
-    assert isinstance(inserted, typed_ast.ast3.AST), type(inserted)
-    assert isinstance(anchor, typed_ast.ast3.AST), type(anchor)
-    node_path = node_path_in_ast(tree, anchor)
+    assert isinstance(tree, AST_TYPES), type(tree)
+    assert isinstance(inserted, AST_TYPES), type(inserted)
+    assert isinstance(anchor, AST_TYPES), type(anchor)
+    node_path = node_path_in_ast(tree, anchor, parent_index)
     if node_path is None:
         raise ValueError('the anchor node {} not found in AST {}'.format(anchor, tree))
     _LOG.debug('node path: %s', node_path)
@@ -264,5 +538,8 @@ def insert_in_tree(
         pass
     else:
         index += 1
-    getattr(parent, field).insert(index, inserted)
+    if parent_index is None:
+        getattr(parent, field).insert(index, inserted)
+    else:
+        parent_index.insert(parent, field, index, inserted)
     return tree
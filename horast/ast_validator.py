@@ -2,7 +2,9 @@
 
 # pylint: disable=invalid-name
 
+import ast
 # import logging
+import sys
 
 from static_typing.ast_manipulation import AstValidator as AstValidatorBase
 import typed_ast.ast3
@@ -11,6 +13,8 @@ from .nodes import Comment, Directive
 
 TypedAstValidatorBase = AstValidatorBase[typed_ast.ast3]
 
+StdlibAstValidatorBase = AstValidatorBase[ast]
+
 # _LOG = logging.getLogger(__name__)
 
 
@@ -28,3 +32,74 @@ class AstValidator(TypedAstValidatorBase):
     def validate_Directive(self, directive):
         assert hasattr(directive, 'expr')
         assert isinstance(directive.expr, str), type(directive.expr)
+
+
+class StdlibAstValidator(StdlibAstValidatorBase):
+    """AST validator for syntax trees obtained by using horast with the built-in ast backend."""
+
+    statement_types = (*StdlibAstValidatorBase.statement_types, Comment, Directive)
+
+    expression_types = (
+        *StdlibAstValidatorBase.expression_types, Comment,
+        *[getattr(ast, _) for _ in ('NamedExpr',) if hasattr(ast, _)])
+
+    validate_Comment = AstValidator.validate_Comment
+
+    validate_Directive = AstValidator.validate_Directive
+
+    def validate_Constant(self, constant):
+        """Constant(constant value, string? kind)"""
+        assert hasattr(constant, 'value')
+
+    def validate_slice(self, slice_):
+        if sys.version_info[:2] < (3, 9):
+            super().validate_slice(slice_)
+            return
+        # since Python 3.9, an index is stored directly as an expression
+        assert isinstance(slice_, (*self.slice_types, *self.expression_types)), type(slice_)
+
+    def validate_NamedExpr(self, named_expr):
+        """NamedExpr(expr target, expr value)"""
+        assert hasattr(named_expr, 'target'), vars(named_expr)
+        assert isinstance(named_expr.target, ast.Name), type(named_expr.target)
+        assert hasattr(named_expr, 'value'), vars(named_expr)
+        self.validate_expression(named_expr.value)
+
+    def validate_Dict(self, dict_):
+        """Dict(expr* keys, expr* values) -- key is None in case of dictionary unpacking"""
+        self._validate_items_in(dict_, 'keys', self._validate_optional_expression)
+        self._validate_items_in(dict_, 'values', self.validate_expression)
+        assert len(dict_.keys) == len(dict_.values), (len(dict_.keys), len(dict_.values))
+
+    def validate_Tuple(self, tuple_):
+        """Tuple(expr* elts, expr_context ctx) -- as slice, it can contain Slice nodes"""
+        self._validate_items_in(tuple_, 'elts', self._validate_expression_or_slice)
+        assert hasattr(tuple_, 'ctx'), vars(tuple_)
+        self.validate_expression_context(tuple_.ctx)
+
+    def validate_arguments(self, arguments):
+        """arguments =
+
+        (arg* posonlyargs, arg* args, arg? vararg, arg* kwonlyargs, expr* kw_defaults,
+         arg? kwarg, expr* defaults) -- kw_defaults are None for arguments without defaults
+        """
+        if hasattr(arguments, 'posonlyargs'):
+            self._validate_items_in(arguments, 'posonlyargs', ast.arg)
+        self._validate_items_in(arguments, 'args', ast.arg)
+        assert hasattr(arguments, 'vararg')
+        if arguments.vararg is not None:
+            assert isinstance(arguments.vararg, ast.arg)
+        self._validate_items_in(arguments, 'kwonlyargs', ast.arg)
+        self._validate_items_in(arguments, 'kw_defaults', self._validate_optional_expression)
+        assert len(arguments.kw_defaults) == len(arguments.kwonlyargs)
+        assert hasattr(arguments, 'kwarg')
+        if arguments.kwarg is not None:
+            assert isinstance(arguments.kwarg, ast.arg)
+        self._validate_items_in(arguments, 'defaults', self.validate_expression)
+
+    def _validate_optional_expression(self, expr):
+        if expr is not None:
+            self.validate_expression(expr)
+
+    def _validate_expression_or_slice(self, expr):
+        assert isinstance(expr, (*self.slice_types, *self.expression_types)), type(expr)
@@ -0,0 +1,119 @@
+"""Parsing many files at once, using a pool of processes."""
+
+import concurrent.futures
+import logging
+import pathlib
+import pickle
+import typing as t
+import zlib
+
+import typed_ast.ast3
+
+from .parser import parse_file
+
+_LOG = logging.getLogger(__name__)
+
+ParseResult = t.NamedTuple('ParseResult', [
+    ('path', pathlib.Path), ('tree', t.Optional[typed_ast.ast3.AST]),
+    ('error', t.Optional[Exception])])
+"""Result of parsing a single file.
+
+Meaning of fields:
+- path is the path of the file, as given
+- tree is the AST of the code in the file; None if parsing failed
+- error is the exception raised while parsing the file; None if parsing succeeded
+"""
+
+
+_COMPRESSION_LEVEL = 1
+"""Level of zlib compression of trees sent back from the workers; the fastest one is used."""
+
+
+def _parse_files(
+        paths: t.Sequence[pathlib.Path], args: tuple, backend: str, kwargs: dict,
+        serialize: bool = False) -> t.List[ParseResult]:
+    """Parse a chunk of files, capturing all errors.
+
+    If serialize is True, each tree is returned pickled and compressed, so that it's compact
+    and so that failure to serialize it is reported as an error of that file only.
+    """
+    results = []
+    for path in paths:
+        try:
+            tree = parse_file(path, *args, backend=backend, **kwargs)
+            if serialize:
+                tree = zlib.compress(
+                    pickle.dumps(tree, protocol=pickle.HIGHEST_PROTOCOL), _COMPRESSION_LEVEL)
+        except Exception as err:  # pylint: disable=broad-except
+            _LOG.debug('failed to parse "%s": %s', path, err)
+            results.append(ParseResult(path, None, err))
+            continue
+        results.append(ParseResult(path, tree, None))
+    return results
+
+
+def _deserialize(result: ParseResult) -> ParseResult:
+    """Restore a tree serialized by _parse_files(), reporting a failure to do so as an error."""
+    if result.tree is None:
+        return result
+    try:
+        tree = pickle.loads(zlib.decompress(result.tree))
+    except Exception as err:  # pylint: disable=broad-except
+        _LOG.debug('failed to deserialize tree of "%s": %s', result.path, err)
+        return ParseResult(result.path, None, err)
+    return ParseResult(result.path, tree, None)
+
+
+def parse_many(
+        paths: t.Iterable[pathlib.Path], *args, workers: t.Optional[int] = None,
+        chunksize: int = 1, ordered: bool = False, backend: str = 'typed_ast',
+        **kwargs) -> t.Iterator[ParseResult]:
+    """Parse many files in parallel, yielding results as soon as they are available.
+
+    Files are split into chunks of given size, and each chunk is parsed by parse_file()
+    in one of the worker processes. Number of workers defaults to number of processors.
+    If workers is 1, files are parsed in the current process instead.
+
+    By default, results are yielded in order of completion. If ordered is True, they are
+    yielded in order of paths instead.
+
+    Failure to parse one file doesn't affect others -- the error is reported in the result.
+
+    Trees are sent back from the workers pickled and compressed, therefore the whole tree,
+    including Comment and Directive nodes, is retained. A tree that cannot be pickled
+    (e.g. because it is too deeply nested) is reported as an error of its file, and if a whole
+    chunk fails (e.g. because a worker died), each of its files gets the error.
+
+    Raise ValueError right away if workers or chunksize is not positive.
+    """
+    if workers is not None and workers < 1:
+        raise ValueError('workers={} must be positive'.format(workers))
+    if chunksize < 1:
+        raise ValueError('chunksize={} must be positive'.format(chunksize))
+    return _parse_many(paths, args, workers, chunksize, ordered, backend, kwargs)
+
+
+def _parse_many(
+        paths: t.Iterable[pathlib.Path], args: tuple, workers: t.Optional[int], chunksize: int,
+        ordered: bool, backend: str, kwargs: dict) -> t.Iterator[ParseResult]:
+    """Implementation of parse_many(), with already validated arguments."""
+    paths = list(paths)
+    if workers == 1:
+        yield from _parse_files(paths, args, backend, kwargs)
+        return
+    chunks = [paths[i:i + chunksize] for i in range(0, len(paths), chunksize)]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_parse_files, chunk, args, backend, kwargs, True): chunk
+                   for chunk in chunks}
+        try:
+            for future in futures if ordered else concurrent.futures.as_completed(futures):
+                try:
+                    results = future.result()
+                except Exception as err:  # pylint: disable=broad-except
+                    _LOG.debug('failed to parse chunk %s: %s', futures[future], err)
+                    results = [ParseResult(path, None, err) for path in futures[future]]
+                for result in results:
+                    yield _deserialize(result)
+        finally:
+            for future in futures:
+                future.cancel()
@@ -0,0 +1,267 @@
+"""Caches of parsed code, addressed by contents of the code."""
+
+import collections
+import functools
+import hashlib
+import logging
+import os
+import pathlib
+import pickle
+import sys
+import tempfile
+import threading
+import typing as t
+
+import typed_ast
+import typed_ast.ast3
+
+from .ast_comments import directive_registry_fingerprint
+from .parser import parse, read_code
+
+_LOG = logging.getLogger(__name__)
+
+DEFAULT_MAX_SIZE = 512 * 1024 ** 2
+"""Default limit of total size of cached trees on disk, in bytes."""
+
+EVICTION_TARGET = 0.9
+"""Fraction of the size limit to which the on-disk cache is reduced when the limit is exceeded.
+
+Evicting below the limit makes the following writes fit within it, so that the cache directory
+is scanned only once in many writes, and not on each of them.
+"""
+
+DEFAULT_MAX_MEMORY_SIZE = 64 * 1024 ** 2
+"""Default limit of total length of results cached in memory."""
+
+DEFAULT_MAX_MEMORY_ENTRIES = 1024
+"""Default limit of number of results cached in memory."""
+
+
+@functools.lru_cache(maxsize=None)
+def _implementation_fingerprint() -> str:
+    """Compute hash of source code of horast, which changes whenever parsing code changes.
+
+    Package version is not used instead, because during development it stays the same
+    while the code changes.
+    """
+    hasher = hashlib.sha256()
+    for source_path in sorted(pathlib.Path(__file__).parent.glob('*.py')):
+        hasher.update('{}\n'.format(source_path.name).encode())
+        hasher.update(source_path.read_bytes())
+    return hasher.hexdigest()
+
+
+class ParseCache:
+
+    """Store ASTs (including Comment and Directive nodes) in a directory on disk.
+
+    Each tree is stored in a separate file, whose name is a hash of the code, of all parse()
+    arguments, of registered directive types, of source code of horast and of versions
+    of typed_ast and Python. Therefore, unchanged code parsed in the same way is never parsed
+    again, and entries never need to be invalidated.
+
+    Entries are written atomically, so the same cache directory can be used by many processes
+    at once. When total size of entries exceeds the limit, least recently used ones are evicted
+    until the size is reduced to EVICTION_TARGET of the limit.
+    """
+
+    def __init__(self, path: pathlib.Path, max_size: int = DEFAULT_MAX_SIZE):
+        if max_size < 0:
+            raise ValueError('max_size={} must not be negative'.format(max_size))
+        self.path = pathlib.Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self._versions = '{} {} {}'.format(
+            _implementation_fingerprint(), typed_ast.__version__,
+            '.'.join(str(_) for _ in sys.version_info[:3]))
+        self._size = sum(entry.stat().st_size for entry in self._entries())
+
+    def _entries(self) -> t.Iterator[pathlib.Path]:
+        return self.path.glob('*/*.pickle')
+
+    def _entry_path(self, key: str) -> pathlib.Path:
+        return self.path.joinpath(key[:2], '{}.pickle'.format(key))
+
+    def key(self, code: str, *args, backend: str = 'typed_ast', **kwargs) -> str:
+        """Compute key of AST of given code parsed with given arguments."""
+        hasher = hashlib.sha256()
+        hasher.update('{}\n{}\n{!r}\n{!r}\n{!r}\n'.format(
+            self._versions, backend, args, sorted(kwargs.items()),
+            directive_registry_fingerprint()).encode())
+        hasher.update(code.encode('utf-8', 'surrogatepass'))
+        return hasher.hexdigest()
+
+    def get(self, key: str) -> t.Optional[typed_ast.ast3.AST]:
+        """Get AST stored under given key, or None if there is no such entry."""
+        entry_path = self._entry_path(key)
+        try:
+            with open(str(entry_path), 'rb') as entry_file:
+                tree = pickle.load(entry_file)
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, pickle.UnpicklingError) as err:
+            _LOG.warning('ignoring unreadable cache entry "%s": %s', entry_path, err)
+            return None
+        try:
+            os.utime(str(entry_path))
+        except OSError:
+            pass  # entry was evicted by another process meanwhile
+        return tree
+
+    def put(self, key: str, tree: typed_ast.ast3.AST) -> None:
+        """Store AST under given key, evicting least recently used entries if needed.
+
+        If the tree cannot be pickled (e.g. because it is too deeply nested, or it contains
+        directives of a locally defined class), it's not stored.
+        """
+        try:
+            data = pickle.dumps(tree, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as err:  # pylint: disable=broad-except
+            _LOG.debug('not caching tree under key %s: %s', key, err)
+            return
+        entry_path = self._entry_path(key)
+        entry_path.parent.mkdir(exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+                dir=str(entry_path.parent), suffix='.tmp', delete=False) as entry_file:
+            try:
+                entry_file.write(data)
+            except BaseException:
+                entry_file.close()
+                os.remove(entry_file.name)
+                raise
+        try:
+            replaced_size = entry_path.stat().st_size
+        except FileNotFoundError:
+            replaced_size = 0
+        os.replace(entry_file.name, str(entry_path))
+        self._size += len(data) - replaced_size
+        if self._size > self.max_size:
+            self.evict()
+
+    def evict(self, target_size: t.Optional[int] = None) -> None:
+        """Remove least recently used entries until their total size is at most target_size.
+
+        By default, target_size is EVICTION_TARGET of the size limit.
+        """
+        if target_size is None:
+            target_size = int(self.max_size * EVICTION_TARGET)
+        entries = []
+        for entry_path in self._entries():
+            try:
+                stat = entry_path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry_path))
+        entries.sort()
+        self._size = sum(size for _, size, _ in entries)
+        for _, size, entry_path in entries:
+            if self._size <= target_size:
+                break
+            try:
+                entry_path.unlink()
+            except FileNotFoundError:
+                pass
+            self._size -= size
+        _LOG.debug('cache "%s" size after eviction: %i', self.path, self._size)
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        self.evict(0)
+
+    def parse(self, code: str, *args, backend: str = 'typed_ast',
+              **kwargs) -> typed_ast.ast3.AST:
+        """Get AST of given code from the cache, or parse it via parse() and store the result."""
+        key = self.key(code, *args, backend=backend, **kwargs)
+        tree = self.get(key)
+        if tree is None:
+            tree = parse(code, *args, backend=backend, **kwargs)
+            self.put(key, tree)
+        return tree
+
+    def parse_file(self, path: pathlib.Path, *args, backend: str = 'typed_ast',
+                   **kwargs) -> typed_ast.ast3.AST:
+        """Like parse(), but read the code via read_code()."""
+        return self.parse(read_code(path), *args, backend=backend, **kwargs)
+
+
+class MemoryCache:
+
+    """Memoize results of parse() in memory, with bounded size and count.
+
+    Trees are stored pickled and each hit unpickles a fresh copy, so that callers can freely
+    modify them. Results are keyed by hash of the code, the arguments and registered directive
+    types. Trees that cannot be pickled (e.g. because they are too deeply nested) are not stored.
+
+    Results of unparse() are not memoized, because computing any structural fingerprint
+    of a tree takes about as long as unparsing it.
+
+    When either limit is exceeded, least recently used results are evicted. Numbers of hits
+    and misses are counted. All operations are thread-safe.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_MEMORY_ENTRIES,
+                 max_size: int = DEFAULT_MAX_MEMORY_SIZE):
+        if max_entries < 0 or max_size < 0:
+            raise ValueError('max_entries={} and max_size={} must not be negative'
+                             .format(max_entries, max_size))
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()  # type: t.Dict[tuple, bytes]
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size(self) -> int:
+        """Total length of all cached results, i.e. of pickled trees."""
+        return self._size
+
+    def _get(self, key: tuple) -> t.Optional[bytes]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return value
+
+    def _put(self, key: tuple, value: bytes) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._size -= len(self._entries.pop(key))
+            self._entries[key] = value
+            self._size += len(value)
+            while self._entries and (
+                    len(self._entries) > self.max_entries or self._size > self.max_size):
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self) -> None:
+        """Remove all results and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self.hits = 0
+            self.misses = 0
+
+    def parse(self, code: str, *args, backend: str = 'typed_ast',
+              **kwargs) -> typed_ast.ast3.AST:
+        """Get a copy of AST of given code if it was already parsed, or parse it via parse()."""
+        key = ('parse', hashlib.sha256(code.encode('utf-8', 'surrogatepass')).digest(),
+               backend, repr(args), repr(sorted(kwargs.items())), directive_registry_fingerprint())
+        data = self._get(key)
+        if data is not None:
+            return pickle.loads(data)
+        tree = parse(code, *args, backend=backend, **kwargs)
+        try:
+            data = pickle.dumps(tree, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as err:  # pylint: disable=broad-except
+            _LOG.debug('not caching tree of code with hash %s: %s', key[1].hex(), err)
+            return tree
+        self._put(key, data)
+        return tree
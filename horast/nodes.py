@@ -1,8 +1,17 @@
-"""Definitions of AST nodes used to store missing syntax information."""
+"""Definitions of AST nodes used to store missing syntax information.
+
+The nodes derive from both typed_ast.ast3.AST and ast.AST, so that they can be used in trees
+created by either of the parser backends.
+
+Fields and location of the nodes are stored in slots, and texts of comments are interned,
+because large codebases have many comments, and many of them are identical.
+"""
 
 # pylint: disable=too-few-public-methods
 
+import ast
 import logging
+import sys
 import tokenize
 import typing as t
 
@@ -11,7 +20,24 @@ import typed_ast.ast3
 _LOG = logging.getLogger(__name__)
 
 
-class Comment(typed_ast.ast3.AST):
+class _SlottedNode(typed_ast.ast3.AST, ast.AST):
+    """Base of nodes that store their fields in slots, and not in a per-instance __dict__.
+
+    The __dict__ is created only if attributes other than fields and location are set.
+    """
+
+    __slots__ = ('lineno', 'col_offset')
+
+    def __reduce__(self):
+        slots = {}
+        for cls in type(self).__mro__:
+            for name in cls.__dict__.get('__slots__', ()):
+                if hasattr(self, name):
+                    slots[name] = getattr(self, name)
+        return type(self), (), (vars(self) or None, slots)
+
+
+class Comment(_SlottedNode):
     """Store code comment in AST.
 
     Examples:
@@ -30,6 +56,8 @@ class Comment(typed_ast.ast3.AST):
      value3)
     """
 
+    __slots__ = ('comment', 'eol')
+
     _fields = typed_ast.ast3.AST._fields + ('comment', 'eol')
 
     @staticmethod
@@ -44,19 +72,20 @@ class Comment(typed_ast.ast3.AST):
         if anchor.index is not None:
             node = node[anchor.index]
         if not hasattr(node, 'lineno'):
+            ast_module = typed_ast.ast3 if isinstance(node, typed_ast.ast3.AST) else ast
             raise ValueError('anchor node {} must have "lineno" attribute'
-                             .format(typed_ast.ast3.dump(node, include_attributes=True)))
+                             .format(ast_module.dump(node, include_attributes=True)))
         return node.lineno == token.start[0] and node.lineno == token.end[0]
 
     @classmethod
     def from_token(cls, token: tokenize.TokenInfo, path_to_anchor, before_anchor):
         eol = cls.is_eol(token, path_to_anchor, before_anchor)
         return cls(
-            comment=token.string[1:], eol=eol,
+            comment=sys.intern(token.string[1:]), eol=eol,
             lineno=token.start[0], col_offset=token.start[1])
 
 
-class BlockComment(typed_ast.ast3.AST):
+class BlockComment(_SlottedNode):
     """Store sequence of code comments as a single node in AST.
 
     Example:
@@ -66,6 +95,8 @@ class BlockComment(typed_ast.ast3.AST):
     # 3rd line of a comment
     """
 
+    __slots__ = ('comments',)
+
     _fields = typed_ast.ast3.AST._fields + ('comments',)
 
     @classmethod
@@ -73,7 +104,7 @@ class BlockComment(typed_ast.ast3.AST):
         raise NotImplementedError()
 
 
-class Directive(typed_ast.ast3.AST):
+class Directive(_SlottedNode):
     """Store directive in AST.
 
     In Python, directives would be expressed as comments, but may have special additional meaning.
@@ -89,6 +120,8 @@ class Directive(typed_ast.ast3.AST):
     #ifndef
     """
 
+    __slots__ = ('expr',)
+
     _comment_prefixes = ('if', 'else', 'endif', 'def', 'undef', 'ifdef', 'ifndef')
 
     _fields = typed_ast.ast3.AST._fields + ('expr',)
@@ -104,7 +137,7 @@ class Directive(typed_ast.ast3.AST):
                 'stripping prefix "%s" and following whitespace from the token %s', prefix, token)
             expr = expr[len(prefix):].lstrip()
         return cls(
-            expr=expr,
+            expr=sys.intern(expr),
             lineno=token.start[0], col_offset=token.start[1])
 
 
@@ -117,6 +150,8 @@ class Pragma(Directive):
     # pragma: ...
     """
 
+    __slots__ = ()
+
     _comment_prefixes = (' pragma:',)
 
 
@@ -128,6 +163,8 @@ class OpenMpPragma(Pragma):
     # pragma: omp parallel for
     """
 
+    __slots__ = ()
+
     _comment_prefixes = (' pragma: omp',)
 
 
@@ -139,6 +176,8 @@ class OpenAccPragma(Pragma):
     # pragma: acc parallel
     """
 
+    __slots__ = ()
+
     _comment_prefixes = (' pragma: acc',)
 
 
@@ -150,4 +189,6 @@ class Include(Directive):
     # include: my_header.h
     """
 
+    __slots__ = ()
+
     _comment_prefixes = (' include:',)
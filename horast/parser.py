@@ -1,20 +1,260 @@
 """Extension of typed_ast parser for Python 3 that retains comments in the AST."""
 
+import ast
+import bisect
+import logging
+import mmap
+import pathlib
+import sys
+import tokenize
+import typing as t
+
 import typed_ast.ast3
 
-from .token_tools import get_comment_tokens
-from .ast_comments import insert_comment_tokens
+from .token_tools import \
+    Scope, LineIndex, get_tokens, filter_comment_tokens, scan_comment_tokens, \
+    has_only_module_level_comments, split_top_level_statements
+from .ast_tools import ROOT_TYPES, ast_module_of, increment_lineno
+from .ast_comments import \
+    are_module_level_comment_tokens, insert_comment_tokens, insert_module_level_comment_tokens
+from .nodes import Comment
+from .stats import current_stats, timed, count
+
+_LOG = logging.getLogger(__name__)
+
+BACKENDS = {'typed_ast': typed_ast.ast3}
+"""AST modules which can be used to parse the code, by the name of the backend.
+
+The built-in ast module is available as a backend only since Python 3.8, because earlier
+it neither parses type comments nor records end positions of nodes.
+"""
+
+if sys.version_info[:2] >= (3, 8):
+    BACKENDS['ast'] = ast
+
+STRATEGIES = ('no comments', 'module level', 'full')
+"""Strategies of inserting comments into the AST, from the cheapest to the most general one.
+
+- 'no comments': there are no comments to insert, and if the code contains no "#" at all,
+  it is not even tokenized
+- 'module level': all comments are full-line comments between top-level statements,
+  so they are placed using only line numbers of top-level statements
+- 'full': scopes of all nodes are found and each comment is placed accordingly
+"""
+
 
+def parse_with_strategy(
+        code: str, *args, backend: str = 'typed_ast',
+        **kwargs) -> t.Tuple[t.Union[typed_ast.ast3.AST, ast.AST], str]:
+    """Parse given code like parse() does, and report which of the STRATEGIES was used.
 
-def parse(code: str, *args, **kwargs) -> typed_ast.ast3.AST:
-    """Parse given code into AST based on typed_ast.ast3 with nodes as defined in horast.nodes."""
+    The cheapest strategy that gives the correct result for the given code is chosen.
+    """
     assert isinstance(code, str), type(code)
+    if backend not in BACKENDS:
+        if backend == 'ast':
+            raise ValueError('backend "ast" requires Python 3.8 or later, but this is Python {}'
+                             .format('.'.join(str(_) for _ in sys.version_info[:3])))
+        raise ValueError('unsupported backend "{}", choose one of: {}'
+                         .format(backend, ', '.join(BACKENDS)))
+    ast_module = BACKENDS[backend]
+    if ast_module is ast:
+        kwargs.setdefault('type_comments', True)
     try:
-        tree = typed_ast.ast3.parse(code, *args, **kwargs)
+        with timed('parse'):
+            tree = ast_module.parse(code, *args, **kwargs)
     except SyntaxError as err:
-        raise SyntaxError('typed_ast.ast3.parse(code{}{}) failed on code:\n"""\n{}\n"""'.format(
+        raise SyntaxError('{}.parse(code{}{}) failed on code:\n"""\n{}\n"""'.format(
+            ast_module.__name__,
             (', args=' + str(args)) if args else '', (', kwargs=' + str(kwargs)) if kwargs else '',
             code)) from err
-    comment_tokens = get_comment_tokens(code)
-    tree = insert_comment_tokens(code, tree, comment_tokens)
+    strategy = 'no comments'
+    if '#' not in code:
+        pass
+    elif ast_module is ast:
+        # end positions are in the AST, so the code doesn't need to be tokenized
+        with timed('scan_comment_tokens'):
+            comment_tokens = scan_comment_tokens(code)
+        count('comments', len(comment_tokens))
+        if not comment_tokens:
+            pass
+        elif isinstance(tree, ROOT_TYPES) and are_module_level_comment_tokens(tree, comment_tokens):
+            strategy = 'module level'
+            with timed('insert_comments'):
+                tree = insert_module_level_comment_tokens(tree, comment_tokens)
+        else:
+            strategy = 'full'
+            with timed('insert_comments'):
+                tree = insert_comment_tokens(code, tree, comment_tokens)
+    else:
+        with timed('get_tokens'):
+            tokens = get_tokens(code)
+        count('tokenizations')
+        comment_tokens = filter_comment_tokens(tokens)
+        count('comments', len(comment_tokens))
+        if not comment_tokens:
+            pass
+        elif isinstance(tree, ROOT_TYPES) and has_only_module_level_comments(tokens):
+            strategy = 'module level'
+            with timed('insert_comments'):
+                tree = insert_module_level_comment_tokens(tree, comment_tokens)
+        else:
+            strategy = 'full'
+            with timed('insert_comments'):
+                tree = insert_comment_tokens(code, tree, comment_tokens, code_tokens=tokens)
+    _LOG.debug('used "%s" strategy to insert comments', strategy)
+    stats = current_stats()
+    if stats is not None:
+        stats.strategies[strategy] += 1
+    return tree, strategy
+
+
+def parse(code: str, *args, backend: str = 'typed_ast',
+          **kwargs) -> t.Union[typed_ast.ast3.AST, ast.AST]:
+    """Parse given code into AST with nodes as defined in horast.nodes.
+
+    By default, the AST is based on typed_ast.ast3. With backend='ast', the AST is created
+    by the built-in ast parser instead (with type comments retained), and the end positions
+    it records are used to place the comments.
+    """
+    tree, _ = parse_with_strategy(code, *args, backend=backend, **kwargs)
     return tree
+
+
+def read_code(path: pathlib.Path) -> str:
+    """Read code from a file, decoding it according to its PEP 263 encoding cookie or BOM.
+
+    The file is memory-mapped and decoded directly from the mapping, so the encoded contents
+    are never copied into a separate bytes object.
+    """
+    with open(str(path), 'rb') as code_file:
+        try:
+            mapping = mmap.mmap(code_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file cannot be mapped
+            return ''
+        with mapping:
+            encoding, _ = tokenize.detect_encoding(mapping.readline)
+            with memoryview(mapping) as buffer:
+                return str(buffer, encoding)
+
+
+def parse_file(path: pathlib.Path, *args, backend: str = 'typed_ast',
+               **kwargs) -> t.Union[typed_ast.ast3.AST, ast.AST]:
+    """Parse code from given file into AST with nodes as defined in horast.nodes.
+
+    The file is read via read_code(), and then parsed just like by parse().
+    """
+    return parse(read_code(path), *args, backend=backend, **kwargs)
+
+
+def parse_iter(stream: t.TextIO, *args, backend: str = 'typed_ast',
+               **kwargs) -> t.Iterator[typed_ast.ast3.AST]:
+    """Parse code read from a text stream, yielding top-level nodes statement by statement.
+
+    Code is read and parsed one top-level statement at a time, and the next statement is read
+    before nodes of the current one are yielded, therefore memory usage depends only on the size
+    of the largest two consecutive statements. Each statement is yielded together with
+    its Comment and Directive nodes, which are placed like by parse() -- top-level comments
+    that follow a statement are yielded right after it.
+
+    Line numbers are as in the whole code. Type ignores of the module are not yielded.
+    """
+    parts = split_top_level_statements(stream.readline)
+    part = next(parts, None)
+    while part is not None:
+        first_lineno, code = part
+        tree = parse(code, *args, backend=backend, **kwargs)
+        part = next(parts, None)
+        for node in tree.body:
+            if part is not None and isinstance(node, Comment) and node.eol:
+                # in the whole code, this comment is placed before the next statement
+                node.eol = False
+            yield increment_lineno(node, first_lineno - 1)
+
+
+def _first_lineno(node: typed_ast.ast3.AST) -> int:
+    """Get number of the first line of a top-level node, including its decorators."""
+    decorators = getattr(node, 'decorator_list', None)
+    if decorators:
+        return min(node.lineno, decorators[0].lineno)
+    return node.lineno
+
+
+def reparse(old_tree: typed_ast.ast3.AST, old_code: str, new_code: str, edit_range: Scope,
+            *args, **kwargs) -> t.Union[typed_ast.ast3.AST, ast.AST]:
+    """Parse code after an edit, reusing AST of the code before the edit.
+
+    The edit replaced text in the edit_range of the old code (as in result of parse()
+    with given arguments) with other text, resulting in the new code.
+
+    Only top-level statements and comments that are on lines affected by the edit are parsed
+    again, and other top-level nodes are reused. Nodes after the edit still need their
+    line numbers shifted if the number of lines changed, which takes time proportional
+    to their count, but it is much faster than parsing them again.
+    The old AST is updated in place and returned.
+
+    Raise ValueError if the edit_range does not fit the old and new code.
+
+    If this is not possible, e.g. because after the edit the affected lines cannot be parsed
+    on their own, the whole new code is parsed.
+    """
+    backend = 'typed_ast' if ast_module_of(old_tree) is typed_ast.ast3 else 'ast'
+    if not isinstance(old_tree, (typed_ast.ast3.Module, ast.Module)):
+        return parse(new_code, *args, backend=backend, **kwargs)
+    old_line_index = LineIndex(old_code)
+    edit_start = old_line_index.to_1d(*edit_range.start)
+    edit_end = old_line_index.to_1d(*edit_range.end)
+    length_delta = len(new_code) - len(old_code)
+    if edit_start > edit_end or edit_end + length_delta < edit_start:
+        raise ValueError('edit_range={} does not fit the old and new code'.format(edit_range))
+    body = old_tree.body
+    starts = [_first_lineno(node) for node in body]
+    statements = [index for index, node in enumerate(body)
+                  if isinstance(node, (typed_ast.ast3.stmt, ast.stmt))]
+    statement_starts = [starts[index] for index in statements]
+
+    # affected lines start at the last statement before the edit, and end just before the first
+    # statement after it -- comments (even if they were placed within the statements) only
+    # determine which nodes are replaced
+    before = bisect.bisect_right(statement_starts, edit_range.start[0])
+    first_line = 1 if before == 0 else statement_starts[before - 1]
+    first_reparsed = bisect.bisect_left(starts, first_line)
+    after = bisect.bisect_right(statement_starts, edit_range.end[0])
+    if after < len(statements):
+        last_reparsed = statements[after]
+        old_last_line = statement_starts[after] - 1
+        old_segment_end = old_line_index.to_1d(old_last_line + 1, 0)
+    else:
+        last_reparsed = len(body)
+        old_last_line = len(old_line_index)
+        old_segment_end = len(old_code)
+    # code before the edit is unchanged, and code after it is only moved by length_delta
+    segment_start = old_line_index.to_1d(first_line, 0)
+    segment = new_code[segment_start:old_segment_end + length_delta]
+    lines_delta = \
+        len(LineIndex(segment)) - len(LineIndex(old_code[segment_start:old_segment_end]))
+    _LOG.debug('re-parsing %i top-level nodes from line %i: """\n%s"""',
+               last_reparsed - first_reparsed, first_line, segment)
+    try:
+        segment_tree = parse(segment, *args, backend=backend, **kwargs)
+    except (SyntaxError, NotImplementedError) as err:
+        _LOG.debug('re-parsing the whole code, because affected lines cannot be parsed: %s', err)
+        return parse(new_code, *args, backend=backend, **kwargs)
+
+    if last_reparsed < len(body):
+        for node in reversed(segment_tree.body):
+            if not isinstance(node, Comment):
+                break
+            # in the whole code, this comment is placed before the next statement
+            node.eol = False
+    increment_lineno(segment_tree, first_line - 1)
+    if lines_delta:
+        for node in body[last_reparsed:]:
+            increment_lineno(node, lines_delta)
+    body[first_reparsed:last_reparsed] = segment_tree.body
+    type_ignores = [_ for _ in old_tree.type_ignores if _.lineno < first_line]
+    type_ignores += segment_tree.type_ignores
+    type_ignores += [increment_lineno(_, lines_delta) for _ in old_tree.type_ignores
+                     if _.lineno > old_last_line]
+    old_tree.type_ignores = type_ignores
+    return old_tree
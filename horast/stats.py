@@ -0,0 +1,102 @@
+"""Opt-in collection of timings and counters of parsing and unparsing."""
+
+import collections
+import contextlib
+import threading
+import time
+import typing as t
+
+
+class _CurrentStats(threading.local):
+
+    """Holder of Stats that are currently being collected in each thread."""
+
+    stats = None  # type: t.Optional[Stats]
+
+
+class _NotTimed:
+
+    """Context manager that does nothing, used when stats are not being collected."""
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+_CURRENT = _CurrentStats()
+
+_NOT_TIMED = _NotTimed()
+
+
+class Stats:
+
+    """Timings and counters of parse() and unparse() calls.
+
+    Meaning of attributes:
+    - times is total wall time in seconds per phase; phases can be nested, e.g. time of
+      'insert_comments' includes time of 'get_ast_node_scopes'
+    - counts is total number of occurrences of various events, like parsed comments or nodes
+    - strategies is number of uses of each of parser.STRATEGIES
+    - unparsed_nodes is number of unparsed nodes per type name
+    """
+
+    def __init__(self):
+        self.times = collections.Counter()  # type: t.Counter[str]
+        self.counts = collections.Counter()  # type: t.Counter[str]
+        self.strategies = collections.Counter()  # type: t.Counter[str]
+        self.unparsed_nodes = collections.Counter()  # type: t.Counter[str]
+
+    @contextlib.contextmanager
+    def timed(self, phase: str) -> t.Iterator[None]:
+        """Add time spent within the context to the total time of a given phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[phase] += time.perf_counter() - start
+
+    def as_dict(self) -> t.Dict[str, t.Dict[str, t.Union[int, float]]]:
+        """Export all collected data as a dict of dicts."""
+        return {
+            'times': dict(self.times), 'counts': dict(self.counts),
+            'strategies': dict(self.strategies), 'unparsed_nodes': dict(self.unparsed_nodes)}
+
+
+@contextlib.contextmanager
+def collect_stats(stats: t.Optional[Stats] = None) -> t.Iterator[Stats]:
+    """Collect stats of all parse() and unparse() calls within the context.
+
+    Calls in other threads (and in worker processes of parse_many()) are not included.
+    Stats are added to given Stats object, or to a new one. Outside of this context,
+    only a negligible overhead remains.
+    """
+    if stats is None:
+        stats = Stats()
+    previous_stats = _CURRENT.stats
+    _CURRENT.stats = stats
+    try:
+        yield stats
+    finally:
+        _CURRENT.stats = previous_stats
+
+
+def current_stats() -> t.Optional[Stats]:
+    """Get Stats that are currently being collected, or None if they are not."""
+    return _CURRENT.stats
+
+
+def timed(phase: str) -> t.ContextManager[None]:
+    """Time the context as a given phase, if stats are being collected."""
+    stats = _CURRENT.stats
+    if stats is None:
+        return _NOT_TIMED
+    return stats.timed(phase)
+
+
+def count(event: str, number: int = 1) -> None:
+    """Count occurrences of a given event, if stats are being collected."""
+    stats = _CURRENT.stats
+    if stats is not None:
+        stats.counts[event] += number
@@ -0,0 +1,348 @@
+# Rules of assigning tokens to nodes in this module are ported from mark_tokens.py of asttokens
+# (https://github.com/gristlabs/asttokens), and modified to work on typed_ast.ast3 AST
+# and on pre-computed tokens of the code.
+#
+# Original work Copyright 2016 Grist Labs, Inc.
+# Modified work Copyright 2017-2019 Mateusz Bysiek  https://mbdevpl.github.io/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Find ranges of tokens that correspond to nodes of typed_ast.ast3 AST."""
+
+import bisect
+import logging
+import token
+import tokenize
+import typing as t
+
+import typed_ast.ast3
+
+from .token_tools import Scope, LineIndex, get_tokens
+
+_LOG = logging.getLogger(__name__)
+
+NON_CODING_TOKENS = (tokenize.NL, tokenize.COMMENT, tokenize.ENCODING)
+
+UNMARKED_TYPES = (
+    typed_ast.ast3.expr_context, typed_ast.ast3.boolop, typed_ast.ast3.operator,
+    typed_ast.ast3.unaryop, typed_ast.ast3.cmpop)
+
+MATCHING_PAIRS_LEFT = {'(': ')', '[': ']', '{': '}'}
+
+MATCHING_PAIRS_RIGHT = {')': '(', ']': '[', '}': '{'}
+
+EMPTY_SCOPE = Scope((1, 0), (1, 0))
+
+
+def iter_children(node: typed_ast.ast3.AST) -> t.Iterator[typed_ast.ast3.AST]:
+    """Iterate over children of a node that can be marked with tokens."""
+    if isinstance(node, typed_ast.ast3.JoinedStr):
+        return
+    for _, field_value in typed_ast.ast3.iter_fields(node):
+        if isinstance(field_value, list):
+            for field_value_elem in field_value:
+                if isinstance(field_value_elem, typed_ast.ast3.AST) \
+                        and not isinstance(field_value_elem, UNMARKED_TYPES):
+                    yield field_value_elem
+        elif isinstance(field_value, typed_ast.ast3.AST) \
+                and not isinstance(field_value, UNMARKED_TYPES):
+            yield field_value
+
+
+class TokenMarker:
+
+    """Assign the first and the last token to each node of typed_ast.ast3 AST.
+
+    This works directly on the tree created by typed_ast parser and on the tokens of the code,
+    therefore the code is neither parsed nor tokenized again.
+
+    The rules follow those of asttokens package for Python 3.7 grammar, on which typed_ast.ast3
+    is based. Expression contexts, operators and contents of f-strings are not marked.
+    """
+
+    def __init__(self, code: str, tokens: t.List[tokenize.TokenInfo] = None,
+                 line_index: LineIndex = None):
+        assert isinstance(code, str), type(code)
+        self.code = code
+        self.tokens = get_tokens(code) if tokens is None else tokens
+        self.line_index = LineIndex(code) if line_index is None else line_index
+        self._token_starts = [_.start for _ in self.tokens]
+        self._ranges = {}  # type: t.Dict[int, t.Tuple[int, int]]
+
+    def token_at(self, lineno: int, col_offset: int) -> int:
+        """Find index of the token containing or preceding the given location."""
+        return max(0, bisect.bisect_right(self._token_starts, (lineno, col_offset)) - 1)
+
+    def is_extra(self, index: int) -> bool:
+        return self.tokens[index].type in NON_CODING_TOKENS
+
+    def next_token(self, index: int, include_extra: bool = False) -> int:
+        index = min(index + 1, len(self.tokens) - 1)
+        while not include_extra and self.is_extra(index) and index < len(self.tokens) - 1:
+            index += 1
+        return index
+
+    def prev_token(self, index: int, include_extra: bool = False) -> int:
+        index = max(index - 1, 0)
+        while not include_extra and self.is_extra(index) and index > 0:
+            index -= 1
+        return index
+
+    def match(self, index: int, token_type: int, string: str = None) -> bool:
+        token_ = self.tokens[index]
+        return token_.type == token_type and (string is None or token_.string == string)
+
+    def match_op(self, index: int, string: str) -> bool:
+        token_ = self.tokens[index]
+        return token_.type == token.OP and token_.string == string
+
+    def find_token(self, index: int, token_type: int, string: str = None,
+                   reverse: bool = False) -> int:
+        """Find the nearest token of the given type (and string) starting at the given index."""
+        while not self.match(index, token_type, string):
+            if reverse:
+                if index == 0:
+                    break
+                index -= 1
+            else:
+                if self.tokens[index].type == token.ENDMARKER:
+                    break
+                index += 1
+        return index
+
+    def _node_token(self, node: typed_ast.ast3.AST) -> t.Optional[int]:
+        col_offset = getattr(node, 'col_offset', None)
+        if col_offset is None:
+            if isinstance(node, typed_ast.ast3.mod):
+                # assume that the module starts at the start of the code
+                return self.token_at(1, 0)
+            return None
+        if col_offset < 0:
+            # multi-line string, for which the parser reports the last line
+            return self.token_at(node.lineno, 0)
+        return self.token_at(node.lineno, self.line_index.utf8_to_col(node.lineno, col_offset))
+
+    def mark(self, tree: typed_ast.ast3.AST) -> t.Dict[int, t.Tuple[int, int]]:
+        """Mark all nodes in the tree and return mapping: id(node) -> (first, last) indices."""
+        stack = [(tree, None, None, False)]
+        while stack:
+            node, parent_token, node_token, visited = stack.pop()
+            if visited:
+                self._mark_node(node, parent_token, node_token)
+                continue
+            node_token = self._node_token(node)
+            stack.append((node, parent_token, node_token, True))
+            child_parent_token = parent_token if node_token is None else node_token
+            for child in reversed(list(iter_children(node))):
+                stack.append((child, child_parent_token, None, False))
+        return self._ranges
+
+    def _mark_node(self, node, parent_token: t.Optional[int], node_token: t.Optional[int]):
+        first = node_token
+        last = None
+        for child in iter_children(node):
+            child_first, child_last = self._ranges[id(child)]
+            if first is None or child_first < first:
+                first = child_first
+            if last is None or child_last > last:
+                last = child_last
+        if first is None:
+            first = 0 if parent_token is None else parent_token
+        if last is None:
+            last = first
+        if isinstance(node, typed_ast.ast3.stmt):
+            last = self._find_last_in_stmt(last)
+        first, last = self._expand_to_matching_pairs(first, last)
+        visitor = getattr(self, 'visit_{}'.format(type(node).__name__), None)
+        if visitor is not None:
+            new_first, new_last = visitor(node, first, last)
+            if (new_first, new_last) != (first, last):
+                first, last = self._expand_to_matching_pairs(new_first, new_last)
+        self._ranges[id(node)] = (first, last)
+
+    def _find_last_in_stmt(self, index: int) -> int:
+        while not self.match(index, token.NEWLINE) and not self.match_op(index, ';') \
+                and self.tokens[index].type != token.ENDMARKER:
+            index = self.next_token(index, include_extra=True)
+        return self.prev_token(index)
+
+    def _expand_to_matching_pairs(self, first: int, last: int) -> t.Tuple[int, int]:
+        """Extend the range to include closing (or opening) brackets of unmatched ones inside."""
+        to_match_right = []  # type: t.List[str]
+        to_match_left = []  # type: t.List[str]
+        for index in range(first, last + 1):
+            token_ = self.tokens[index]
+            if token_.type != token.OP:
+                continue
+            if to_match_right and token_.string == to_match_right[-1]:
+                to_match_right.pop()
+            elif token_.string in MATCHING_PAIRS_LEFT:
+                to_match_right.append(MATCHING_PAIRS_LEFT[token_.string])
+            elif token_.string in MATCHING_PAIRS_RIGHT:
+                to_match_left.append(MATCHING_PAIRS_RIGHT[token_.string])
+        for match in reversed(to_match_right):
+            index = self.next_token(last)
+            while self.match_op(index, ',') or self.match_op(index, ':'):
+                index = self.next_token(index)
+            if self.match_op(index, match):
+                last = index
+        for match in to_match_left:
+            index = self.prev_token(first)
+            if self.match_op(index, match):
+                first = index
+        return first, last
+
+    def _gobble_parens(self, first: int, last: int) -> t.Tuple[int, int]:
+        if first > 0:
+            prev = self.prev_token(first)
+            next_ = self.next_token(last)
+            if self.match_op(prev, '(') and self.match_op(next_, ')'):
+                return prev, next_
+        return first, last
+
+    def _handle_following_brackets(self, node, last: int, opening_bracket: str) -> int:
+        first_child = next(iter_children(node))
+        _, first_child_last = self._ranges[id(first_child)]
+        bracket = self.find_token(first_child_last, token.OP, opening_bracket)
+        return max(bracket, last)
+
+    def _handle_str(self, first: int, last: int) -> t.Tuple[int, int]:
+        index = self.next_token(last)
+        while self.match(index, token.STRING):
+            last = index
+            index = self.next_token(last)
+        return first, last
+
+    def _handle_def(self, node, first: int, last: int) -> t.Tuple[int, int]:
+        if first > 0:
+            prev = self.prev_token(first)
+            if self.match_op(prev, '@'):
+                first = prev
+        return first, last
+
+    def _handle_async(self, node, first: int, last: int) -> t.Tuple[int, int]:
+        if self.tokens[first].string != 'async':
+            first = self.prev_token(first)
+        return first, last
+
+    def visit_ListComp(self, node, first: int, last: int) -> t.Tuple[int, int]:
+        before = self.prev_token(first)
+        if self.match_op(before, '['):
+            first = before
+        return first, last
+
+    def visit_comprehension(self, node, first: int, last: int) -> t.Tuple[int, int]:
+        return self.find_token(first, token.NAME, 'for', reverse=True), last
+
+    def visit_If(self, node, first: int, last: int) -> t.Tuple[int, int]:
+        while first > 0 and self.tokens[first].string not in ('if', 'elif'):
+            first = self.prev_token(first)
+        return first, last
+
+    def visit_Attribute(self, node, first: int, last: int) -> t.Tuple[int, int]:
+        dot = self.find_token(last, token.OP, '.')
+        name = self.next_token(dot)
+        return first, name if self.match(name, token.NAME) else last
+
+    visit_ClassDef = _handle_def
+
+    visit_FunctionDef = _handle_def
+
+    def visit_AsyncFunctionDef(self, node, first: int, last: int) -> t.Tuple[int, int]:
+        if self.match(first, token.NAME, 'def'):
+            first = self.prev_token(first)
+        return self._handle_def(node, first, last)
+
+    visit_AsyncFor = _handle_async
+
+    visit_AsyncWith = _handle_async
+
+    def visit_Call(self, node, first: int, last: int) -> t.Tuple[int, int]:
+        last = self._handle_following_brackets(node, last, '(')
+        if self.match_op(first, '@'):
+            first = self.next_token(first)
+        return first, last
+
+    def visit_Subscript(self, node, first: int, last: int) -> t.Tuple[int, int]:
+        return first, self._handle_following_brackets(node, last, '[')
+
+    def visit_Slice(self, node, first: int, last: int) -> t.Tuple[int, int]:
+        while self.match_op(self.prev_token(first), ':'):
+            first = self.prev_token(first)
+        while self.match_op(self.next_token(last), ':'):
+            last = self.next_token(last)
+        return first, last
+
+    def visit_Tuple(self, node, first: int, last: int) -> t.Tuple[int, int]:
+        if not node.elts:
+            return first, last
+        maybe_comma = self.next_token(last)
+        if self.match_op(maybe_comma, ','):
+            last = maybe_comma
+        return self._gobble_parens(first, last)
+
+    def visit_Str(self, node, first: int, last: int) -> t.Tuple[int, int]:
+        return self._handle_str(first, last)
+
+    visit_Bytes = visit_Str
+
+    def visit_JoinedStr(self, node, first: int, last: int) -> t.Tuple[int, int]:
+        fstring_start = getattr(token, 'FSTRING_START', None)
+        if fstring_start is None:
+            return self._handle_str(first, last)
+        index = first
+        while True:
+            if self.match(index, fstring_start):
+                depth = 1
+                while depth > 0:
+                    index = self.next_token(index)
+                    if self.match(index, fstring_start):
+                        depth += 1
+                    elif self.match(index, token.FSTRING_END):  # pylint: disable=no-member
+                        depth -= 1
+            elif not self.match(index, token.STRING):
+                break
+            last = index
+            index = self.next_token(last)
+        return first, last
+
+    def visit_Num(self, node, first: int, last: int) -> t.Tuple[int, int]:
+        while self.match(last, token.OP) and last < len(self.tokens) - 1:
+            last = self.next_token(last)
+        value = node.n.imag if isinstance(node.n, complex) else node.n
+        if value < 0 and self.match(first, token.NUMBER):
+            first = self.prev_token(first)
+        return first, last
+
+    def visit_keyword(self, node, first: int, last: int) -> t.Tuple[int, int]:
+        if node.arg is not None:
+            equals = self.find_token(first, token.OP, '=', reverse=True)
+            name = self.prev_token(equals)
+            if self.match(name, token.NAME, node.arg):
+                first = name
+        return first, last
+
+    def visit_Starred(self, node, first: int, last: int) -> t.Tuple[int, int]:
+        if not self.match_op(first, '*'):
+            star = self.prev_token(first)
+            if self.match_op(star, '*'):
+                first = star
+        return first, last
+
+    def scope(self, node: typed_ast.ast3.AST) -> Scope:
+        """Get scope of a marked node. Unmarked nodes have empty scope at the start of the code."""
+        try:
+            first, last = self._ranges[id(node)]
+        except KeyError:
+            return EMPTY_SCOPE
+        return Scope(self.tokens[first].start, self.tokens[last].end)
@@ -1,23 +1,98 @@
 """Various helper functions to query and manipulate tokens."""
 
+import array
+import bisect
 import io
+import re
+import sys
 import tokenize
 import typing as t
 import warnings
 
 Scope = t.NamedTuple('Scope', [('start', t.Tuple[int, int]), ('end', t.Tuple[int, int])])
 
+UNIVERSAL_LINE_SEPARATOR = r'\r\n|\r|\n'
+
+_LONE_CARRIAGE_RETURN = re.compile(r'\r(?!\n)')
+
+
+class LineIndex:
+
+    """Convert between 1D indices in text and 2D (lineno, col_offset) locations.
+
+    Starts of lines are found once and stored in an array, and each conversion uses bisection.
+
+    By default, all of "\\r\\n", "\\r" and "\\n" are treated as line separators.
+    If starts of all lines except the first one are already known, they can be given instead,
+    and then the text is not scanned.
+    """
+
+    def __init__(self, text: str, line_separator: str = UNIVERSAL_LINE_SEPARATOR,
+                 newline_starts: t.Optional[t.Iterable[int]] = None):
+        assert isinstance(text, str), type(text)
+        self.text = text
+        self.text_length = len(text)
+        self.line_starts = array.array('q', [0])
+        if newline_starts is None:
+            newline_starts = (m.end() for m in re.finditer(line_separator, text))
+        self.line_starts.extend(newline_starts)
+        self._ascii_lines = {}  # type: t.Dict[int, bool]
+
+    def __len__(self) -> int:
+        """Number of lines."""
+        return len(self.line_starts)
+
+    def line(self, lineno: int) -> str:
+        """Get text of a given line, including the line separator."""
+        if lineno < 1 or lineno > len(self.line_starts):
+            raise ValueError('lineno={} is outside [1,{}]'.format(lineno, len(self.line_starts)))
+        if lineno == len(self.line_starts):
+            return self.text[self.line_starts[lineno - 1]:]
+        return self.text[self.line_starts[lineno - 1]:self.line_starts[lineno]]
+
+    def utf8_to_col(self, lineno: int, utf8_col_offset: int) -> int:
+        """Convert offset of UTF-8 bytes in a given line (as in AST nodes) into col_offset."""
+        is_ascii = self._ascii_lines.get(lineno)
+        if is_ascii is None:
+            line = self.line(lineno)
+            is_ascii = len(line) == len(line.encode())
+            self._ascii_lines[lineno] = is_ascii
+        if is_ascii:
+            return utf8_col_offset
+        return len(self.line(lineno).encode()[:utf8_col_offset].decode(errors='replace'))
+
+    def to_2d(self, index: int) -> t.Tuple[int, int]:
+        """Convert 1D index in text to tuple (lineno, col_offset)."""
+        if index < 0 or index > self.text_length:
+            raise ValueError('index={} is outside [0,{}]'.format(index, self.text_length))
+        lineno = bisect.bisect_right(self.line_starts, index)
+        return lineno, index - self.line_starts[lineno - 1]
+
+    def to_1d(self, lineno: int, col_offset: int) -> int:
+        """Convert (lineno, col_offset) location to 1D index in text."""
+        if lineno < 1 or lineno > len(self.line_starts):
+            raise ValueError('lineno={} is outside [1,{}]'.format(lineno, len(self.line_starts)))
+        index = self.line_starts[lineno - 1] + col_offset
+        if col_offset < 0 or index > self.text_length:
+            raise ValueError('col_offset={} is outside of line {}'.format(col_offset, lineno))
+        return index
+
 
 def get_token_scope(token: tokenize.TokenInfo):
     return Scope(token.start, token.end)
 
 
 def get_tokens(code: str, token_filter=None) -> t.List[tokenize.TokenInfo]:
-    """List of all tokens contained in the given code."""
+    """List of all tokens contained in the given code.
+
+    The code is tokenized directly as str, therefore there is no ENCODING token in the result.
+
+    Lines are split like in LineIndex, so that token locations match locations in the AST.
+    Since tokenize does not end lines at a lone "\\r", each one is tokenized as "\\n" instead.
+    """
     assert isinstance(code, str), type(code)
-    code_bytes = code.encode()  # type: bytes
-    with io.BytesIO(code_bytes) as code_bytes_reader:
-        tokenizer = tokenize.tokenize(code_bytes_reader.readline)
+    with io.StringIO(_LONE_CARRIAGE_RETURN.sub('\n', code)) as code_reader:
+        tokenizer = tokenize.generate_tokens(code_reader.readline)
         tokens = [token for token in tokenizer if token_filter is None or token_filter(token)]
     return tokens
 
@@ -35,7 +110,170 @@ def is_comment_but_not_type_comment(token: tokenize.TokenInfo) -> bool:
 
 
 def get_comment_tokens(code: str, ignore_type_comments: bool = True) -> t.List[tokenize.TokenInfo]:
-    return get_tokens(code, is_comment_but_not_type_comment if ignore_type_comments else is_comment)
+    return scan_comment_tokens(code, ignore_type_comments)
+
+
+_COMMENT_SCANNER = re.compile(
+    r'(?P<comment>#[^\r\n]*)'
+    r'|(?P<string>'
+    r"'''[^'\\]*(?:(?:\\[\s\S]|'(?!''))[^'\\]*)*'''"
+    r'|"""[^"\\]*(?:(?:\\[\s\S]|"(?!""))[^"\\]*)*"""'
+    r"|'[^'\n\\]*(?:\\[\s\S][^'\n\\]*)*'"
+    r'|"[^"\n\\]*(?:\\[\s\S][^"\n\\]*)*")'
+    r'|(?P<undecided>[\'"])')
+"""Find the next comment or string literal; a quote that does not start a valid literal is left
+undecided."""
+
+_FSTRING_MAY_CONTAIN_COMMENTS = sys.version_info[:2] >= (3, 12)
+"""Since Python 3.12, f-string replacement fields can contain quotes and even comments."""
+
+
+def scan_comment_tokens(
+        code: str, ignore_type_comments: bool = True) -> t.List[tokenize.TokenInfo]:
+    """List comment tokens in the given code, without tokenizing it.
+
+    Comments and string literals (including triple-quoted strings and f-strings) are matched
+    by a single compiled regular expression, therefore "#" inside strings is not a comment.
+
+    The tokens are the same as those found by tokenize, which is used as a fallback
+    if the code contains something that the scanner cannot classify on its own (e.g. a quote
+    which does not start a complete string literal).
+    """
+    assert isinstance(code, str), type(code)
+    token_filter = is_comment_but_not_type_comment if ignore_type_comments else is_comment
+    if _LONE_CARRIAGE_RETURN.search(code) is not None:
+        return get_tokens(code, token_filter)
+    tokens = []
+    lineno = 1
+    counted_until = 0
+    for match in _COMMENT_SCANNER.finditer(code):
+        kind = match.lastgroup
+        start = match.start()
+        if kind == 'string':
+            if _FSTRING_MAY_CONTAIN_COMMENTS and '{' in match.group() \
+                    and 'f' in code[max(0, start - 2):start].lower():
+                return get_tokens(code, token_filter)
+            continue
+        if kind == 'undecided':
+            return get_tokens(code, token_filter)
+        string = match.group()
+        if ignore_type_comments and string.startswith('# type:'):
+            continue
+        lineno += code.count('\n', counted_until, start)
+        counted_until = start
+        line_start = code.rfind('\n', 0, start) + 1
+        line_end = code.find('\n', start)
+        line = code[line_start:] if line_end == -1 else code[line_start:line_end + 1]
+        col_offset = start - line_start
+        tokens.append(tokenize.TokenInfo(
+            tokenize.COMMENT, string, (lineno, col_offset), (lineno, col_offset + len(string)),
+            line))
+    return tokens
+
+
+def filter_comment_tokens(
+        tokens: t.Iterable[tokenize.TokenInfo],
+        ignore_type_comments: bool = True) -> t.List[tokenize.TokenInfo]:
+    """Select comment tokens from already tokenized code."""
+    token_filter = is_comment_but_not_type_comment if ignore_type_comments else is_comment
+    return [token for token in tokens if token_filter(token)]
+
+
+BLOCK_CONTINUATION_KEYWORDS = ('elif', 'else', 'except', 'finally')
+"""Keywords that start a clause of a compound statement that already started on earlier line."""
+
+
+def has_only_module_level_comments(
+        tokens: t.Iterable[tokenize.TokenInfo], ignore_type_comments: bool = True) -> bool:
+    """Check if all comments in tokenized code are full-line comments between top-level statements.
+
+    Such comments can be placed in the AST knowing only the line numbers of top-level statements.
+
+    A comment is considered to be between top-level statements if it follows the end
+    of a logical line (that is not a decorator) and precedes either the end of the code
+    or a token that starts a new top-level statement.
+    """
+    unverified_comment = False
+    logical_line_ended = True
+    line_first_token = None
+    prev_line_first_token = None
+    for token in tokens:
+        token_type = token.type
+        if token_type == tokenize.COMMENT:
+            if ignore_type_comments and is_type_comment(token):
+                continue
+            if not logical_line_ended or prev_line_first_token is not None \
+                    and prev_line_first_token.string == '@':
+                return False
+            unverified_comment = True
+            continue
+        if token_type in (tokenize.NL, tokenize.DEDENT, tokenize.ENCODING):
+            continue
+        if unverified_comment:
+            if token_type == tokenize.INDENT or token_type != tokenize.ENDMARKER and (
+                    token.start[1] != 0 or token.string in BLOCK_CONTINUATION_KEYWORDS):
+                return False
+            unverified_comment = False
+        if token_type == tokenize.NEWLINE:
+            logical_line_ended = True
+            prev_line_first_token = line_first_token
+            line_first_token = None
+            continue
+        if line_first_token is None:
+            line_first_token = token
+        logical_line_ended = False
+    return True
+
+
+def split_top_level_statements(
+        readline: t.Callable[[], str]) -> t.Iterator[t.Tuple[int, str]]:
+    """Read code line by line and split it into top-level statements.
+
+    Yield tuples of the number of the first line and the code of each top-level statement,
+    together with its decorators and with comments and empty lines that follow it.
+    Comments that precede the first statement are yielded with it.
+
+    Code is tokenized as it is read, and only lines of the current statement are retained.
+    If code cannot be tokenized, the rest of it is yielded as one part.
+    """
+    lines = []
+    first_lineno = 1
+
+    def read_line() -> str:
+        line = readline()
+        lines.append(line)
+        return line
+
+    statement_started = False
+    decorated = False
+    logical_line_ended = True
+    try:
+        for token in tokenize.generate_tokens(read_line):
+            token_type = token.type
+            if token_type == tokenize.NEWLINE:
+                logical_line_ended = True
+                continue
+            if not logical_line_ended or token_type in (
+                    tokenize.COMMENT, tokenize.NL, tokenize.INDENT, tokenize.DEDENT,
+                    tokenize.ENDMARKER):
+                continue
+            logical_line_ended = False
+            lineno, col_offset = token.start
+            if col_offset != 0:
+                continue
+            if statement_started and not decorated \
+                    and token.string not in BLOCK_CONTINUATION_KEYWORDS:
+                index = lineno - first_lineno
+                yield first_lineno, ''.join(lines[:index])
+                del lines[:index]
+                first_lineno = lineno
+            statement_started = True
+            decorated = token.string == '@'
+    except tokenize.TokenError:
+        pass  # the rest is yielded as is, so that parsing it reports the error
+    code = ''.join(lines)
+    if code:
+        yield first_lineno, code
 
 
 def get_token_locations(tokens: t.List[tokenize.TokenInfo]) -> t.List[t.Tuple[int, int]]:
@@ -1,17 +1,46 @@
 """Extension of typed_astunpare unparser for Python 3 that generates code with comments."""
 
 import ast
+import copy
 import io
 import logging
+import typing as t
 
 from astunparse.unparser import interleave
 import typed_ast.ast3
+from static_typing.nodes import StaticallyTyped
 import static_typing.unparser
 
-from .nodes import Comment
+from .nodes import Comment, Directive, Pragma, OpenMpPragma, OpenAccPragma, Include
+from .ast_tools import ROOT_TYPES, ast_to_list
+from .stats import Stats, current_stats, timed
 
 _LOG = logging.getLogger(__name__)
 
+_STATICALLY_TYPED = tuple(StaticallyTyped.values())
+
+DIRECTIVE_PREFIXES = {
+    Directive: '',
+    Pragma: ' pragma: ',
+    OpenMpPragma: ' pragma: omp ',
+    OpenAccPragma: ' pragma: acc ',
+    Include: ' include: '}
+"""Code between "#" and the expression of each kind of directive."""
+
+
+def _directive_prefix(node_type: type) -> str:
+    """Get code between "#" and the expression of a given kind of directive.
+
+    For directives other than those in DIRECTIVE_PREFIXES, it is determined by _comment_prefixes,
+    in the same way as for them.
+    """
+    try:
+        return DIRECTIVE_PREFIXES[node_type]
+    except KeyError:
+        pass
+    prefixes = node_type._comment_prefixes  # pylint: disable=protected-access
+    return '{} '.format(prefixes[0]) if len(prefixes) == 1 else ''
+
 
 def interleave_noncomment(inter, f, seq):
     """Call f on each item in seq, calling inter() in between."""
@@ -78,8 +107,11 @@ class Unparser(static_typing.unparser.Unparser):
             (k, v, comments) = triple
             for comment in comments:
                 self.dispatch(comment)
-            self.dispatch(k)
-            self.write(": ")
+            if k is None:  # dictionary unpacking in built-in ast
+                self.write("**")
+            else:
+                self.dispatch(k)
+                self.write(": ")
             self.dispatch(v)
         interleave(lambda: self.write(", "), write_triple, zip(
             noncomment_keys, noncomment_values, comment_groups))
@@ -95,11 +127,44 @@ class Unparser(static_typing.unparser.Unparser):
             interleave_noncomment(lambda: self.write(", "), self.dispatch, t.elts)
         self.write(")")
 
-    def _Call(self, t):
-        if isinstance(t, ast.Call):
-            super()._Call(t)
+    def _Subscript(self, t):
+        if not isinstance(t.slice, ast.Tuple) or not t.slice.elts:
+            super()._Subscript(t)
             return
+        # since Python 3.9, built-in ast stores also extended slices as expressions
+        self.dispatch(t.value)
+        self.write("[")
+        interleave_noncomment(lambda: self.write(", "), self.dispatch, t.slice.elts)
+        if len(t.slice.elts) == 1:
+            self.write(",")
+        self.write("]")
 
+    def _arguments(self, t):
+        posonlyargs = getattr(t, 'posonlyargs', None)
+        if not posonlyargs:
+            super()._arguments(t)
+            return
+        all_defaults = [None] * (len(posonlyargs) + len(t.args) - len(t.defaults)) + t.defaults
+        for arg, default in zip(posonlyargs, all_defaults):
+            self.dispatch(arg)
+            if default:
+                self.write("=")
+                self.dispatch(default)
+            self.write(",")
+            if getattr(arg, 'type_comment', None) is not None:
+                self._write_type_comment(arg.type_comment)
+                self.fill('        ')
+            else:
+                self.write(" ")
+        self.write("/")
+        if t.args or t.vararg or t.kwonlyargs or t.kwarg:
+            self.write(", ")
+            other_args = copy.copy(t)
+            other_args.posonlyargs = []
+            other_args.defaults = [_ for _ in all_defaults[len(posonlyargs):] if _ is not None]
+            super()._arguments(other_args)
+
+    def _Call(self, t):
         self.dispatch(t.func)
         self.write("(")
         comma = False
@@ -121,40 +186,125 @@ class Unparser(static_typing.unparser.Unparser):
                 comma = False
         self.write(")")
 
+    _dispatch_table = {}  # type: t.Dict[type, t.Callable[[Unparser, t.Any], None]]
+
+    def __init__(self, *args, **kwargs):
+        cls = type(self)
+        if '_dispatch_table' not in cls.__dict__:  # each subclass has its own dispatch table
+            cls._dispatch_table = {}
+        super().__init__(*args, **kwargs)
+
+    @classmethod
+    def _dispatch_method(cls, node_type: type) -> t.Callable[['Unparser', t.Any], None]:
+        """Find method that unparses nodes of given type, and remember it."""
+        method = getattr(cls, '_{}'.format(node_type.__name__), None)
+        if method is None and issubclass(node_type, Pragma):
+            method = cls._prefixed_Pragma
+        if method is None and issubclass(node_type, Directive):
+            method = cls._prefixed_Directive
+        if method is None and node_type is not list \
+                and not issubclass(node_type, _STATICALLY_TYPED):
+            raise NotImplementedError('unparsing {} nodes is not supported'.format(
+                node_type.__name__))
+        if method is None:  # lists and statically typed nodes need additional handling
+            method = static_typing.unparser.Unparser.dispatch
+        cls._dispatch_table[node_type] = method
+        return method
+
+    def dispatch(self, tree):
+        try:
+            method = self._dispatch_table[type(tree)]
+        except KeyError:
+            method = self._dispatch_method(type(tree))
+        method(self, tree)
+
     def _Comment(self, node):
         if node.eol:
             self.write('  #')
         else:
             self.fill('#')
-        # import ipdb; ipdb.set_trace()
         self.write(node.comment)
 
     def _generic_Directive(self, node, prefix: str = ''):
-        self.fill('#{}'.format(prefix))
+        self.fill('#' + prefix)
         self.write(node.expr)
 
-    def _Directive(self, node):
-        self._generic_Directive(node)
-
     def _generic_Pragma(self, node, prefix: str = ''):
-        self._generic_Directive(node, ' pragma: {}'.format(prefix))
+        self._generic_Directive(node, DIRECTIVE_PREFIXES[Pragma] + prefix)
 
-    def _Pragma(self, node):
-        self._generic_Pragma(node)
+    def _prefixed_Directive(self, node):
+        self._generic_Directive(node, _directive_prefix(type(node)))
 
-    def _OpenMpPragma(self, node):
-        self._generic_Pragma(node, 'omp ')
-
-    def _OpenAccPragma(self, node):
-        self._generic_Pragma(node, 'acc ')
+    def _prefixed_Pragma(self, node):
+        prefix = _directive_prefix(type(node))
+        pragma_prefix = DIRECTIVE_PREFIXES[Pragma]
+        if not prefix.startswith(pragma_prefix):
+            self._generic_Directive(node, prefix)
+            return
+        self._generic_Pragma(node, prefix[len(pragma_prefix):])
 
-    def _Include(self, node):
-        self._generic_Directive(node, ' include: ')
+    _Directive = _prefixed_Directive
+    _Pragma = _prefixed_Pragma
+    _OpenMpPragma = _prefixed_Pragma
+    _OpenAccPragma = _prefixed_Pragma
+    _Include = _prefixed_Directive
 
 
 def unparse(tree: typed_ast.ast3.AST, *args, **kwargs) -> str:
-    """Unparse AST based on typed_ast.ast3 with nodes as defined in horast.nodes into code."""
-    assert isinstance(tree, typed_ast.ast3.AST), type(tree)
+    """Unparse AST with nodes as defined in horast.nodes into code.
+
+    The AST can be based either on typed_ast.ast3 or on the built-in ast module.
+    """
+    assert isinstance(tree, (typed_ast.ast3.AST, ast.AST)), type(tree)
     stream = io.StringIO()
-    Unparser(tree, *args, file=stream, **kwargs)
-    return stream.getvalue()
+    with timed('unparse'):
+        Unparser(tree, *args, file=stream, **kwargs)
+    code = stream.getvalue()
+    stats = current_stats()
+    if stats is not None:
+        _count_unparsed(stats, tree, code)
+    return code
+
+
+def _count_unparsed(stats: Stats, tree: typed_ast.ast3.AST, code: str) -> None:
+    if tree is not None:
+        stats.unparsed_nodes.update(type(node).__name__ for node in ast_to_list(tree))
+    stats.counts['unparsed_bytes'] += len(code.encode('utf-8', 'surrogatepass'))
+
+
+def iter_unparse(tree: typed_ast.ast3.AST, *args, **kwargs) -> t.Iterator[str]:
+    """Unparse AST like unparse(), but yield the code one top-level statement at a time.
+
+    Only code of the current top-level statement (or comment) is kept in memory,
+    and concatenation of all yielded parts is the same as result of unparse().
+    """
+    assert isinstance(tree, (typed_ast.ast3.AST, ast.AST)), type(tree)
+    if not isinstance(tree, ROOT_TYPES):
+        yield unparse(tree, *args, **kwargs)
+        return
+    stream = io.StringIO()
+    unparser = Unparser(type(tree)(body=[]), *args, file=stream, **kwargs)
+    stats = current_stats()
+    if stats is not None:
+        _count_unparsed(stats, tree, '\n')
+    for node in tree.body:
+        stream.seek(0)
+        stream.truncate()
+        with timed('unparse'):
+            unparser.dispatch(node)
+        code = stream.getvalue()
+        if stats is not None:
+            _count_unparsed(stats, None, code)
+        yield code
+    yield '\n'
+
+
+def unparse_to(tree: typed_ast.ast3.AST, file: t.TextIO, *args, **kwargs) -> None:
+    """Unparse AST like unparse(), but write the code to a text stream.
+
+    Code is written (in a single write) and discarded after each top-level statement, therefore
+    memory usage depends only on the size of the largest statement.
+    """
+    for code in iter_unparse(tree, *args, **kwargs):
+        file.write(code)
+    file.flush()
@@ -1,13 +1,100 @@
 """Setup script for horast package."""
 
+import pathlib
+import subprocess
+import typing as t
+
+import setuptools.command.build_py
+import setuptools.command.sdist
+
 import setup_boilerplate
 
+HERE = pathlib.Path(__file__).resolve().parent
+
+VERSION_MODULE = pathlib.Path('horast', '_version.py')
+
+VERSION_MODULE_TEMPLATE = '''"""Version of horast package.
+
+This file was generated from the git repository by setup.py when the package was built.
+"""
+
+VERSION = {!r}
+'''
+
+
+def version_from_git_description(description: str) -> str:
+    """Convert result of "git describe --tags --long --dirty" into a PEP 440 version.
+
+    Release commits are tagged like "v1.2.3". Commits after a release get a post-release version
+    with the number of commits since the release, and unreleased code gets a local version label
+    with its commit hash, e.g. "1.2.3.post4+gabc1234" or "1.2.3+gabc1234.dirty".
+    """
+    dirty = description.endswith('-dirty')
+    if dirty:
+        description = description[:-len('-dirty')]
+    tag, distance, commit = description.rsplit('-', 2)
+    if not tag.startswith('v'):
+        raise ValueError('tag "{}" in "{}" is not like "v1.2.3"'.format(tag, description))
+    version = tag[1:]
+    if distance != '0':
+        version += '.post{}'.format(distance)
+    if distance != '0' or dirty:
+        version += '+{}'.format(commit) + ('.dirty' if dirty else '')
+    return version
+
+
+def find_git_version(repo_path: pathlib.Path = HERE) -> t.Optional[str]:
+    """Determine version of the package from its git repository.
+
+    Return None if the package is not in a git repository (e.g. when it is built
+    from a source distribution), or if the repository has no release tags.
+    """
+    if not repo_path.joinpath('.git').exists():
+        return None
+    try:
+        process = subprocess.run(
+            ['git', 'describe', '--tags', '--long', '--dirty', '--match', 'v[0-9]*'],
+            cwd=str(repo_path), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            universal_newlines=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return version_from_git_description(process.stdout.strip())
+
+
+def write_version_module(path: pathlib.Path, version: str) -> None:
+    """Replace a version module (possibly a link to the source file) with a generated one."""
+    if path.exists():
+        path.unlink()
+    path.write_text(VERSION_MODULE_TEMPLATE.format(version), encoding='utf-8')
+
+
+class BuildPy(setuptools.command.build_py.build_py):
+
+    """Build Python modules, and generate version module with the version of the package."""
+
+    def build_module(self, module, module_file, package):
+        outfile, copied = super().build_module(module, module_file, package)
+        if pathlib.Path(outfile) == pathlib.Path(self.build_lib, VERSION_MODULE):
+            write_version_module(pathlib.Path(outfile), self.distribution.get_version())
+        return outfile, copied
+
+
+class SDist(setuptools.command.sdist.sdist):
+
+    """Create source distribution, and generate version module with the version of the package."""
+
+    def make_release_tree(self, base_dir, files):
+        super().make_release_tree(base_dir, files)
+        write_version_module(
+            pathlib.Path(base_dir, VERSION_MODULE), self.distribution.get_version())
+
 
 class Package(setup_boilerplate.Package):
 
     """Package metadata."""
 
     name = 'horast'
+    version = find_git_version()
     description = 'human-oriented ast parser/unparser'
     url = 'https://github.com/mbdevpl/horast'
     classifiers = [
@@ -33,6 +120,7 @@ class Package(setup_boilerplate.Package):
         'Topic :: Utilities']
     keywords = ['abstract syntax tree', 'ast', 'comments', 'directives', 'parsing', 'readability',
                 'type hints', 'unparsing']
+    cmdclass = {'build_py': BuildPy, 'sdist': SDist}
 
 
 if __name__ == '__main__':
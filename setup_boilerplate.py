@@ -254,6 +254,13 @@ class Package:
 
     test_suite = 'test'  # type: str
 
+    cmdclass = {}  # type: t.Mapping[str, type]
+    """A dictionary of custom setuptools commands, which replace the default ones of the same name.
+
+    Example entry:
+    'build_py': CustomBuildPy
+    """
+
     @classmethod
     def try_fields(cls, *names) -> t.Optional[t.Any]:
         """Return first existing of given class field names."""
@@ -315,4 +322,5 @@ class Package:
             package_data=cls.package_data, exclude_package_data=cls.exclude_package_data,
             install_requires=cls.install_requires, extras_require=cls.extras_require,
             python_requires=cls.python_requires,
-            entry_points=cls.entry_points, test_suite=cls.test_suite)
+            entry_points=cls.entry_points, test_suite=cls.test_suite,
+            cmdclass=dict(cls.cmdclass))
@@ -1,3 +1,5 @@
 """Tests for horast package."""
 
-from horast import _logging
+from horast._logging import configure_logging
+
+configure_logging()
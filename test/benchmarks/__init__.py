@@ -0,0 +1,174 @@
+"""Benchmarks of horast over a vendored corpus of real-world-like code.
+
+Run them via "python -m test.benchmarks", see "python -m test.benchmarks --help".
+"""
+
+import json
+import math
+import pathlib
+import platform
+import sys
+import time
+import tracemalloc
+import typing as t
+
+from horast.ast_tools import ast_to_list
+from horast.ast_validator import AstValidator, StdlibAstValidator
+from horast.parser import BACKENDS as PARSER_BACKENDS, parse
+from horast.unparser import unparse
+
+CORPUS_PATH = pathlib.Path(__file__).resolve().parent.joinpath('corpus')
+
+BASELINE_PATH = pathlib.Path(__file__).resolve().parent.joinpath('baseline.json')
+
+BACKENDS = tuple(PARSER_BACKENDS)
+
+VALIDATORS = {'typed_ast': AstValidator, 'ast': StdlibAstValidator}
+
+
+def _prepare_code(code: str, backend: str) -> str:
+    return code
+
+
+def _prepare_tree(code: str, backend: str):
+    return parse(code, backend=backend)
+
+
+def _roundtrip(code: str, backend: str) -> str:
+    return unparse(parse(code, backend=backend))
+
+
+def _validate(tree, backend: str) -> None:
+    VALIDATORS[backend]().visit(tree)
+
+
+# for each operation: function that prepares its input (not measured) and the operation itself
+OPERATIONS = {
+    'parse': (_prepare_code, lambda code, backend: parse(code, backend=backend)),
+    'unparse': (_prepare_tree, lambda tree, backend: unparse(tree)),
+    'roundtrip': (_prepare_code, _roundtrip),
+    'validate': (_prepare_tree, _validate)}
+
+# for each measured metric: True if higher values are better
+METRICS = {
+    'lines_per_s': True,
+    'nodes_per_s': True,
+    'latency_p50': False,
+    'latency_p90': False,
+    'latency_p99': False,
+    'peak_memory': False}
+
+
+def load_corpus(path: pathlib.Path = CORPUS_PATH) -> t.Dict[str, str]:
+    """Read all Python files from the corpus directory."""
+    return {file_path.name: file_path.read_text(encoding='utf-8')
+            for file_path in sorted(path.glob('*.py'))}
+
+
+def percentile(values: t.Sequence[float], rank: float) -> float:
+    """Compute a percentile of given values using the nearest-rank method."""
+    if not values:
+        raise ValueError('percentile of an empty sequence is undefined')
+    sorted_values = sorted(values)
+    index = max(math.ceil(rank / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[index]
+
+
+def benchmark_operation(
+        operation: str, backend: str, corpus: t.Mapping[str, str],
+        repeat: int = 5) -> t.Dict[str, float]:
+    """Measure throughput, latency percentiles and peak memory of an operation over a corpus.
+
+    Throughput and latency come from repeat timed runs over every file in the corpus,
+    and peak memory comes from a separate run under tracemalloc, so that tracing
+    does not distort the timings.
+    """
+    prepare, run = OPERATIONS[operation]
+    inputs = [prepare(code, backend) for code in corpus.values()]
+    lines = sum(len(code.splitlines()) for code in corpus.values())
+    nodes = sum(len(ast_to_list(parse(code, backend=backend))) for code in corpus.values())
+
+    latencies = []
+    for _ in range(repeat):
+        for input_ in inputs:
+            start = time.perf_counter()
+            run(input_, backend)
+            latencies.append(time.perf_counter() - start)
+    total_time = sum(latencies) / repeat
+
+    tracemalloc.start()
+    try:
+        for input_ in inputs:
+            run(input_, backend)
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'lines_per_s': lines / total_time,
+        'nodes_per_s': nodes / total_time,
+        'latency_p50': percentile(latencies, 50),
+        'latency_p90': percentile(latencies, 90),
+        'latency_p99': percentile(latencies, 99),
+        'peak_memory': peak_memory}
+
+
+def run_benchmarks(
+        corpus: t.Optional[t.Mapping[str, str]] = None,
+        operations: t.Iterable[str] = tuple(OPERATIONS), backends: t.Iterable[str] = BACKENDS,
+        repeat: int = 5) -> t.Dict[str, t.Any]:
+    """Run all requested benchmarks and gather their results in a JSON-serializable dict.
+
+    Results are stored by keys like "parse typed_ast".
+    """
+    if corpus is None:
+        corpus = load_corpus()
+    results = {}
+    for operation in operations:
+        for backend in backends:
+            results['{} {}'.format(operation, backend)] = benchmark_operation(
+                operation, backend, corpus, repeat)
+    return {
+        'python': platform.python_version(),
+        'platform': sys.platform,
+        'corpus': {name: len(code.splitlines()) for name, code in corpus.items()},
+        'repeat': repeat,
+        'results': results}
+
+
+def compare_results(
+        baseline: t.Mapping[str, t.Any], current: t.Mapping[str, t.Any],
+        tolerance: float = 0.25) -> t.List[str]:
+    """Find metrics that became worse than in the baseline by more than a relative tolerance.
+
+    Return a list of human-readable descriptions of regressions, empty if there are none.
+    Benchmarks present in only one of the results are ignored.
+    """
+    regressions = []
+    for name, baseline_metrics in sorted(baseline['results'].items()):
+        if name not in current['results']:
+            continue
+        current_metrics = current['results'][name]
+        for metric, higher_is_better in METRICS.items():
+            old, new = baseline_metrics[metric], current_metrics[metric]
+            if not old:
+                continue
+            if higher_is_better:
+                regressed = new < old * (1 - tolerance)
+            else:
+                regressed = new > old * (1 + tolerance)
+            if regressed:
+                regressions.append('{}: {} regressed from {:.6g} to {:.6g} ({:+.1%})'.format(
+                    name, metric, old, new, new / old - 1))
+    return regressions
+
+
+def read_results(path: pathlib.Path) -> t.Dict[str, t.Any]:
+    with path.open(encoding='utf-8') as results_file:
+        return json.load(results_file)
+
+
+def write_results(results: t.Mapping[str, t.Any], path: pathlib.Path) -> None:
+    with path.open('w', encoding='utf-8') as results_file:
+        json.dump(results, results_file, indent=2, sort_keys=True)
+        results_file.write('\n')
@@ -0,0 +1,108 @@
+"""Command-line interface of horast benchmarks."""
+
+import argparse
+import json
+import pathlib
+import sys
+
+from . import (
+    BACKENDS, BASELINE_PATH, OPERATIONS, compare_results, read_results, run_benchmarks,
+    write_results)
+from .memory import COMMENTS, MIN_SAVING, check_memory
+from .scaling import MAX_EXPONENT, SCENARIOS, check_scaling
+
+
+def main(args=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='python -m test.benchmarks',
+        description='Measure throughput, latency and peak memory of horast over a corpus.')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    run_parser = subparsers.add_parser('run', help='run benchmarks and store results as JSON')
+    run_parser.add_argument(
+        '--output', type=pathlib.Path, default=None,
+        help='file to store the results in; by default they are printed')
+    run_parser.add_argument('--repeat', type=int, default=5, help='number of timed runs')
+    run_parser.add_argument(
+        '--operation', dest='operations', action='append', choices=tuple(OPERATIONS),
+        help='operation to measure; can be repeated; by default all are measured')
+    run_parser.add_argument(
+        '--backend', dest='backends', action='append', choices=BACKENDS,
+        help='backend to measure; can be repeated; by default all are measured')
+
+    compare_parser = subparsers.add_parser(
+        'compare', help='compare results with a baseline and report regressions')
+    compare_parser.add_argument('current', type=pathlib.Path, help='results to check')
+    compare_parser.add_argument(
+        '--baseline', type=pathlib.Path, default=BASELINE_PATH,
+        help='baseline results (default: %(default)s)')
+    compare_parser.add_argument(
+        '--tolerance', type=float, default=0.25,
+        help='allowed relative worsening of each metric (default: %(default)s)')
+
+    scaling_parser = subparsers.add_parser(
+        'scaling', help='fit exponents of runtime against input size on synthetic inputs')
+    scaling_parser.add_argument(
+        '--max-exponent', type=float, default=MAX_EXPONENT,
+        help='largest allowed exponent (default: %(default)s)')
+    scaling_parser.add_argument(
+        '--scale', type=float, default=1.0, help='multiplier of input sizes (default: %(default)s)')
+    scaling_parser.add_argument('--repeat', type=int, default=3, help='number of timed runs')
+    scaling_parser.add_argument(
+        '--scenario', dest='scenarios', action='append', choices=tuple(SCENARIOS),
+        help='parameter to vary; can be repeated; by default all are checked')
+    scaling_parser.add_argument(
+        '--backend', dest='backends', action='append', choices=BACKENDS,
+        help='backend to measure; can be repeated; by default all are measured')
+
+    memory_parser = subparsers.add_parser(
+        'memory', help='compare memory taken by comment nodes with and without slots')
+    memory_parser.add_argument(
+        '--comments', type=int, default=COMMENTS,
+        help='number of comments (default: %(default)s)')
+    memory_parser.add_argument(
+        '--min-saving', type=float, default=MIN_SAVING,
+        help='smallest allowed relative saving of memory (default: %(default)s)')
+
+    parsed_args = parser.parse_args(args)
+
+    if parsed_args.command == 'run':
+        results = run_benchmarks(
+            operations=parsed_args.operations or tuple(OPERATIONS),
+            backends=parsed_args.backends or BACKENDS, repeat=parsed_args.repeat)
+        if parsed_args.output is None:
+            print(json.dumps(results, indent=2, sort_keys=True))
+        else:
+            write_results(results, parsed_args.output)
+        return 0
+
+    if parsed_args.command == 'scaling':
+        results, violations = check_scaling(
+            parsed_args.max_exponent, backends=parsed_args.backends or BACKENDS,
+            scenarios=parsed_args.scenarios or tuple(SCENARIOS), scale=parsed_args.scale,
+            repeat=parsed_args.repeat)
+        for name, result in results.items():
+            print('{}: exponent {:.2f}'.format(name, result['exponent']))
+        for violation in violations:
+            print(violation)
+        return 1 if violations else 0
+
+    if parsed_args.command == 'memory':
+        results, violations = check_memory(parsed_args.comments, parsed_args.min_saving)
+        for kind, memory in results.items():
+            print('{}: {} bytes'.format(kind, memory))
+        for violation in violations:
+            print(violation)
+        return 1 if violations else 0
+
+    regressions = compare_results(
+        read_results(parsed_args.baseline), read_results(parsed_args.current),
+        parsed_args.tolerance)
+    for regression in regressions:
+        print(regression)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,155 @@
+# Copyright 2019 Example Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Scheduling of jobs, with comments on almost every line."""
+
+import heapq  # priority queue of jobs
+import itertools  # for unique job counters
+import time  # for timestamps
+
+# default priority of a job
+DEFAULT_PRIORITY = 5  # the lower, the more urgent
+
+# priorities by name: critical jobs run immediately, high ones soon, low ones when idle,
+# and background jobs can be dropped
+PRIORITIES = {
+    'critical': 0, 'high': 2, 'normal': DEFAULT_PRIORITY, 'low': 8, 'background': 10}
+
+# states of a job: waiting in the queue, being executed, and final states
+STATES = ['pending', 'running', 'done', 'failed', 'cancelled']
+FINAL_STATES = STATES[2:]  # finished successfully, with an error, or removed from the queue
+
+
+class Job:
+    """A unit of work."""
+
+    # counter of created jobs, used to break ties between priorities
+    _counter = itertools.count()
+
+    def __init__(self, name, action, priority=DEFAULT_PRIORITY):
+        # user-visible name
+        self.name = name
+        # callable that does the work
+        self.action = action
+        # priority, see PRIORITIES
+        self.priority = priority
+        # unique number
+        self.number = next(self._counter)
+        # initial state
+        self.state = 'pending'  # see STATES
+        self.result = None  # set when done
+        self.error = None  # set when failed
+        self.created = time.monotonic()  # time of creation
+
+    def __lt__(self, other):
+        # more urgent jobs first
+        if self.priority != other.priority:
+            return self.priority < other.priority  # lower value wins
+        # older jobs first
+        return self.number < other.number
+
+    def run(self):
+        # mark as running
+        self.state = 'running'
+        try:
+            # do the work
+            self.result = self.action()
+        except Exception as err:  # any failure of the job
+            # remember the error
+            self.error = err
+            self.state = 'failed'
+        else:
+            # success
+            self.state = 'done'
+        # result of the action, or None
+        return self.result
+
+
+class Scheduler:
+    """A priority queue of jobs."""
+
+    def __init__(self):
+        self._queue = []  # heap of jobs
+        self._jobs = {}  # jobs by name
+        # statistics: all submitted jobs, jobs done or failed, and jobs removed before running
+        self.stats = {'submitted': 0, 'completed': 0, 'cancelled': 0}
+
+    def submit(self, name, action, priority='normal'):
+        # resolve priority by name
+        if isinstance(priority, str):
+            priority = PRIORITIES[priority]  # may raise KeyError
+        # create the job
+        job = Job(name, action, priority)
+        # enqueue it
+        heapq.heappush(self._queue, job)
+        self._jobs[name] = job
+        self.stats['submitted'] += 1  # count it
+        return job
+
+    def cancel(self, name):
+        # find the job
+        job = self._jobs.pop(name, None)
+        if job is None:
+            return False  # nothing to cancel
+        # it stays in the heap, but it is skipped when popped
+        job.state = 'cancelled'
+        self.stats['cancelled'] += 1
+        return True
+
+    def run_next(self):
+        # skip cancelled jobs
+        while self._queue:
+            job = heapq.heappop(self._queue)  # the most urgent one
+            if job.state == 'cancelled':
+                continue  # already counted
+            # run it
+            job.run()
+            self.stats['completed'] += 1
+            self._jobs.pop(job.name, None)  # forget it
+            return job
+        # queue is empty
+        return None
+
+    def run_all(self):
+        # run until the queue is empty
+        results = []
+        while True:
+            job = self.run_next()
+            if job is None:
+                break  # done
+            results.append((job.name, job.state, job.result))  # summary of the job
+        return results
+
+
+def summarize(results):
+    # count jobs per state
+    counts = {state: 0 for state in STATES}  # all states, even unused
+    for _, state, _ in results:
+        counts[state] += 1
+    # format the summary, e.g. "done: 3", only with states that occurred
+    return ', '.join(
+        '{}: {}'.format(state, count) for state, count in counts.items() if count)
+
+
+# example usage
+if __name__ == '__main__':
+    # create a scheduler
+    scheduler = Scheduler()
+    # submit some jobs
+    scheduler.submit('a', lambda: 1 + 1)  # trivial
+    scheduler.submit('b', lambda: 1 / 0, 'high')  # fails
+    scheduler.submit('c', lambda: sum(range(10)), 'low')
+    scheduler.cancel('c')  # never runs
+    # run them
+    print(summarize(scheduler.run_all()))  # done: 1, failed: 1
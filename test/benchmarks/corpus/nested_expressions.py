@@ -0,0 +1,67 @@
+"""Deeply nested expressions, as often found in generated code."""
+
+POLYNOMIAL = lambda x: (((((((((1.0 * x + 2.0) * x + 3.0) * x + 4.0) * x + 5.0) * x + 6.0) * x
+                            + 7.0) * x + 8.0) * x + 9.0) * x + 10.0)
+
+CONDITION = lambda a, b, c, d: ((a and (b or (c and (d or (a and (b or (c and not d))))))) or (
+    not a and (not b or (not c and (not d or (not a and (not b or (not c and d))))))))
+
+CHOICE = lambda x: 'a' if x < 1 else ('b' if x < 2 else ('c' if x < 3 else ('d' if x < 4 else (
+    'e' if x < 5 else ('f' if x < 6 else ('g' if x < 7 else ('h' if x < 8 else 'i')))))))
+
+TREE = {
+    'name': 'root',
+    'children': [
+        {'name': 'a', 'children': [
+            {'name': 'a1', 'children': [{'name': 'a1x', 'children': [
+                {'name': 'a1x1', 'children': [{'name': 'a1x1y', 'children': []}]}]}]},
+            {'name': 'a2', 'children': [{'name': 'a2x', 'children': [
+                {'name': 'a2x1', 'children': [{'name': 'a2x1y', 'children': []}]}]}]}]},
+        {'name': 'b', 'children': [
+            {'name': 'b1', 'children': [{'name': 'b1x', 'children': [
+                {'name': 'b1x1', 'children': [{'name': 'b1x1y', 'children': [
+                    {'name': 'b1x1y1', 'children': [
+                        {'name': 'b1x1y1z', 'children': []}]}]}]}]}]}]}]}
+
+MATRIX = [[[[i * j * k * l for l in range(2)] for k in range(2)] for j in range(2)]
+          for i in range(2)]
+
+PIPELINE = sorted(set(map(str, filter(None, map(lambda x: x % 7, map(
+    lambda x: x * x, filter(lambda x: x % 2, range(1, 100))))))), key=lambda s: (len(s), s))
+
+
+def evaluate(expression, env):
+    return (expression[0] == 'add' and evaluate(expression[1], env) + evaluate(
+        expression[2], env)) or (expression[0] == 'mul' and evaluate(
+            expression[1], env) * evaluate(expression[2], env)) or (
+                expression[0] == 'var' and env[expression[1]]) or (
+                    expression[0] == 'const' and expression[1]) or 0
+
+
+def generated_kernel(a, b, c, d, e, f):
+    return ((((a + b) * (c - d)) / ((e + f) * (a - b) + 1)) ** 2 + (((c * d) - (e / (f + 1)))
+            * ((a + c) - (b + d)))) - ((((((a * b) + (c * d)) - (e * f)) + ((a - f) * (b - e)))
+                                       * (((c + d) * (e + f)) - ((a * c) + (b * d))))
+                                      / ((((a + 1) * (b + 1)) * ((c + 1) * (d + 1))) + 1))
+
+
+def nested_calls(x):
+    return abs(round(max(min(float(str(abs(round(max(min(x, 100), -100), 2)))), 50), -50),
+                     1))
+
+
+def nested_subscripts(data):
+    return data[0][1][2][3][4] + data[data[0][0][0][0][0]][1][2][3][4] + data[
+        data[data[0][0][0][0][0]][0][0][0][0]][1][2][3][4]
+
+
+def nested_comprehensions(n):
+    return {i: {j: [(i, j, k) for k in range(n) if (i + j + k) % 2 == 0]
+                for j in range(n) if {k for k in range(j) if k % 3}}
+            for i in range(n) if [j for j in range(i) if j % 2]}
+
+
+def nested_strings(names):
+    return ', '.join('{}={}'.format(name, ' '.join('{}:{}'.format(
+        part, '|'.join(str(ord(char)) for char in part)) for part in name.split('_')))
+                     for name in names)
@@ -0,0 +1,146 @@
+"""Numeric kernels annotated with OpenMP and OpenACC pragmas, as used for transpilation."""
+
+# pragma: once
+
+import math
+
+
+def saxpy(n, a, x, y):
+    # pragma: omp parallel for
+    for i in range(n):
+        y[i] = a * x[i] + y[i]
+    return y
+
+
+def dot(n, x, y):
+    result = 0.0
+    # pragma: omp parallel for reduction(+:result)
+    for i in range(n):
+        result += x[i] * y[i]
+    return result
+
+
+def matmul(n, m, p, a, b, c):
+    # pragma: acc data copyin(a[0:n*m], b[0:m*p]) copyout(c[0:n*p])
+    # pragma: acc parallel loop gang collapse(2)
+    for i in range(n):
+        for j in range(p):
+            total = 0.0
+            # pragma: acc loop vector reduction(+:total)
+            for k in range(m):
+                total += a[i * m + k] * b[k * p + j]
+            c[i * p + j] = total
+    # pragma: acc end data
+    return c
+
+
+def jacobi(n, iterations, grid, new_grid):
+    # pragma: omp parallel
+    for _ in range(iterations):
+        # pragma: omp for collapse(2) schedule(static)
+        for i in range(1, n - 1):
+            for j in range(1, n - 1):
+                new_grid[i][j] = 0.25 * (
+                    grid[i - 1][j] + grid[i + 1][j] + grid[i][j - 1] + grid[i][j + 1])
+        # pragma: omp barrier
+        # pragma: omp single
+        grid, new_grid = new_grid, grid
+    return grid
+
+
+def stencil_3d(nx, ny, nz, u, v, c0, c1):
+    # pragma: acc parallel loop collapse(3) present(u, v)
+    for i in range(1, nx - 1):
+        for j in range(1, ny - 1):
+            for k in range(1, nz - 1):
+                v[i][j][k] = c0 * u[i][j][k] + c1 * (
+                    u[i - 1][j][k] + u[i + 1][j][k]
+                    + u[i][j - 1][k] + u[i][j + 1][k]
+                    + u[i][j][k - 1] + u[i][j][k + 1])
+    return v
+
+
+def histogram(n, values, bins, counts):
+    width = 1.0 / bins
+    # pragma: omp parallel for
+    for i in range(n):
+        index = min(int(values[i] / width), bins - 1)
+        # pragma: omp atomic
+        counts[index] += 1
+    return counts
+
+
+def norm2(n, x):
+    total = 0.0
+    # pragma: acc parallel loop reduction(+:total)
+    for i in range(n):
+        total += x[i] * x[i]
+    return math.sqrt(total)
+
+
+def lu_decompose(n, a):
+    for k in range(n):
+        # pragma: omp parallel for
+        for i in range(k + 1, n):
+            a[i][k] /= a[k][k]
+        # pragma: omp parallel for collapse(2)
+        for i in range(k + 1, n):
+            for j in range(k + 1, n):
+                a[i][j] -= a[i][k] * a[k][j]
+    return a
+
+
+def nbody_step(n, dt, positions, velocities, masses):
+    # pragma: acc kernels
+    for i in range(n):
+        ax, ay, az = 0.0, 0.0, 0.0
+        # pragma: acc loop independent reduction(+:ax,ay,az)
+        for j in range(n):
+            dx = positions[j][0] - positions[i][0]
+            dy = positions[j][1] - positions[i][1]
+            dz = positions[j][2] - positions[i][2]
+            dist2 = dx * dx + dy * dy + dz * dz + 1e-9
+            inv = masses[j] / (dist2 * math.sqrt(dist2))
+            ax += dx * inv
+            ay += dy * inv
+            az += dz * inv
+        velocities[i][0] += dt * ax
+        velocities[i][1] += dt * ay
+        velocities[i][2] += dt * az
+    # pragma: acc end kernels
+    # pragma: omp parallel for simd
+    for i in range(n):
+        positions[i][0] += dt * velocities[i][0]
+        positions[i][1] += dt * velocities[i][1]
+        positions[i][2] += dt * velocities[i][2]
+    return positions, velocities
+
+
+def prefix_sum(n, x, out):
+    # pragma: omp parallel for ordered
+    for i in range(n):
+        # pragma: omp ordered
+        out[i] = x[i] + (out[i - 1] if i > 0 else 0)
+    return out
+
+
+def transpose(n, m, a, b):
+    # pragma: omp parallel for collapse(2)
+    for i in range(n):
+        for j in range(m):
+            b[j][i] = a[i][j]
+    return b
+
+
+def convolve(n, k, signal, kernel, out):
+    half = k // 2
+    # pragma: acc parallel loop copyin(signal[0:n], kernel[0:k]) copyout(out[0:n])
+    for i in range(n):
+        total = 0.0
+        # pragma: acc loop seq
+        for j in range(k):
+            index = i + j - half
+            if 0 <= index < n:
+                total += signal[index] * kernel[j]
+        out[i] = total
+    return out
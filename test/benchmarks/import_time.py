@@ -0,0 +1,33 @@
+"""Import time of horast, measured using "python -X importtime"."""
+
+import pathlib
+import subprocess
+import sys
+import typing as t
+
+ROOT_PATH = pathlib.Path(__file__).resolve().parents[2]
+
+# modules that are slow to import, and therefore should be imported only when needed
+HEAVY_MODULES = (
+    'static_typing', 'typed_astunparse', 'astunparse', 'version_query', 'numpy',
+    'horast.unparser', 'horast.ast_validator', 'horast.cache', 'horast.batch')
+
+
+def measure_import_times(statement: str) -> t.Dict[str, t.Tuple[int, int]]:
+    """Execute statement in a new interpreter with -X importtime and gather its report.
+
+    Return self and cumulative import time in microseconds of each module imported
+    by the interpreter, including modules imported during its startup.
+    """
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement], cwd=str(ROOT_PATH),
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    import_times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_time, cumulative_time, module_name = line[len('import time:'):].split('|')
+        if not self_time.strip().isdigit():
+            continue  # header
+        import_times[module_name.strip()] = (int(self_time), int(cumulative_time))
+    return import_times
@@ -0,0 +1,77 @@
+"""Memory used by comment nodes, measured using tracemalloc.
+
+Comment nodes store their fields in slots. To check how much memory this saves, the same
+comment tokens are also turned into nodes of an equivalent class that stores its fields
+in a per-instance __dict__, like all nodes did before slots were used.
+
+Texts of comments are interned in both cases, and nodes are created (and kept) once before
+measurement, so that the texts and the table of interned strings are not measured.
+"""
+
+import ast
+import gc
+import sys
+import tokenize
+import tracemalloc
+import typing as t
+
+import typed_ast.ast3
+
+from horast.nodes import Comment
+from horast.token_tools import get_comment_tokens
+
+from ..examples import prepare_synthetic_example
+
+
+class UnslottedComment(typed_ast.ast3.AST, ast.AST):
+    """Comment node that stores its fields in a per-instance __dict__."""
+
+    _fields = Comment._fields
+
+
+# for each kind of nodes: function that creates a node from a comment token
+NODE_KINDS = {
+    'slotted': lambda token: Comment.from_token(token, None, True),
+    'unslotted': lambda token: UnslottedComment(
+        comment=sys.intern(token.string[1:]), eol=False,
+        lineno=token.start[0], col_offset=token.start[1])}
+
+COMMENTS = 50000
+
+MIN_SAVING = 0.5
+
+
+def measure_memory(kind: str, tokens: t.Sequence[tokenize.TokenInfo]) -> int:
+    """Measure memory in bytes taken by nodes of a given kind created from comment tokens."""
+    create = NODE_KINDS[kind]
+    interned_nodes = [create(token) for token in tokens]  # keep the interned texts alive
+    gc.collect()
+    tracemalloc.start()
+    try:
+        nodes = [create(token) for token in tokens]
+        memory, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert len(nodes) == len(interned_nodes)
+    return memory
+
+
+def check_memory(
+        comments: int = COMMENTS,
+        min_saving: float = MIN_SAVING) -> t.Tuple[t.Dict[str, int], t.List[str]]:
+    """Measure memory taken by slotted and unslotted nodes of all comments in a synthetic module.
+
+    Return memory in bytes by kind of nodes, and a list of human-readable descriptions
+    of problems, empty if slotted nodes take at least min_saving (as a fraction) less memory.
+    """
+    tokens = get_comment_tokens(prepare_synthetic_example(comments, comments))
+    assert len(tokens) == comments, (len(tokens), comments)
+    results = {kind: measure_memory(kind, tokens) for kind in NODE_KINDS}
+    saving = 1 - results['slotted'] / results['unslotted']
+    violations = []
+    if saving < min_saving:
+        violations.append(
+            'slotted nodes of {} comments take {} bytes, only {:.1%} less than unslotted ones'
+            ' ({} bytes), below limit of {:.1%}'.format(
+                comments, results['slotted'], saving, results['unslotted'], min_saving))
+    return results, violations
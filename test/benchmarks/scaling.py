@@ -0,0 +1,121 @@
+"""Asymptotic scaling of horast on synthetic inputs.
+
+Runtime is measured for inputs generated by prepare_synthetic_example() with growing
+values of a single parameter, and exponent k of runtime ~ size ** k is fitted
+in log-log scale. An exponent close to 1 means linear scaling, close to 2 quadratic.
+"""
+
+import gc
+import math
+import time
+import typing as t
+
+from horast.parser import BACKENDS, parse
+from horast.unparser import unparse
+
+from ..examples import prepare_synthetic_example
+
+# for each scenario: function making arguments of prepare_synthetic_example() for a given size
+SCENARIOS = {
+    'statements': lambda size: {'statements': size, 'comments': size},
+    'comments': lambda size: {'statements': 50, 'comments': size},
+    'depth': lambda size: {'statements': 1000, 'comments': 1000, 'depth': size},
+    'multiline': lambda size: {'statements': size, 'comments': size, 'multiline': True}}
+
+SIZES = {
+    'statements': (250, 500, 1000, 2000),
+    'comments': (250, 500, 1000, 2000),
+    'depth': (4, 8, 16, 32),
+    'multiline': (250, 500, 1000, 2000)}
+
+# for each operation: function that prepares its input (not measured) and the operation itself
+OPERATIONS = {
+    'parse': (lambda code, backend: code, lambda code, backend: parse(code, backend=backend)),
+    'unparse': (lambda code, backend: parse(code, backend=backend),
+                lambda tree, backend: unparse(tree))}
+
+MAX_EXPONENT = 1.3
+
+MIN_MEASURED_TIME = 0.01
+
+
+def fit_exponent(sizes: t.Sequence[float], times: t.Sequence[float]) -> float:
+    """Fit exponent k of times ~ sizes ** k using least squares in log-log scale."""
+    if len(sizes) != len(times) or len(sizes) < 2:
+        raise ValueError('at least 2 pairs of sizes and times are needed, got {} and {}'
+                         .format(len(sizes), len(times)))
+    log_sizes = [math.log(size) for size in sizes]
+    log_times = [math.log(time_) for time_ in times]
+    mean_size = sum(log_sizes) / len(log_sizes)
+    mean_time = sum(log_times) / len(log_times)
+    covariance = sum((log_size - mean_size) * (log_time - mean_time)
+                     for log_size, log_time in zip(log_sizes, log_times))
+    variance = sum((log_size - mean_size) ** 2 for log_size in log_sizes)
+    return covariance / variance
+
+
+def measure(operation: str, backend: str, code: str, repeat: int = 3) -> float:
+    """Measure the shortest runtime of an operation, with garbage collection disabled.
+
+    Runs shorter than MIN_MEASURED_TIME are grouped in loops that take at least that long,
+    and each of repeat loops is timed.
+    """
+    prepare, run = OPERATIONS[operation]
+    input_ = prepare(code, backend)
+    gc.collect()
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        run(input_, backend)
+        number = max(math.ceil(MIN_MEASURED_TIME / (time.perf_counter() - start)), 1)
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                run(input_, backend)
+            times.append((time.perf_counter() - start) / number)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return min(times)
+
+
+def measure_scaling(
+        operation: str, backend: str, scenario: str, sizes: t.Optional[t.Sequence[int]] = None,
+        repeat: int = 3) -> t.Dict[str, t.Any]:
+    """Measure runtime of an operation for growing sizes in a scenario and fit its exponent."""
+    if sizes is None:
+        sizes = SIZES[scenario]
+    times = [measure(operation, backend, prepare_synthetic_example(**SCENARIOS[scenario](size)),
+                     repeat)
+             for size in sizes]
+    return {'sizes': list(sizes), 'times': times, 'exponent': fit_exponent(sizes, times)}
+
+
+def check_scaling(
+        max_exponent: float = MAX_EXPONENT, operations: t.Iterable[str] = tuple(OPERATIONS),
+        backends: t.Iterable[str] = tuple(BACKENDS),
+        scenarios: t.Iterable[str] = tuple(SCENARIOS), scale: float = 1.0,
+        repeat: int = 3) -> t.Tuple[t.Dict[str, t.Dict[str, t.Any]], t.List[str]]:
+    """Measure scaling in all requested cases, and find exponents above the limit.
+
+    Sizes of each scenario are multiplied by scale (but kept at least 1), so that
+    quicker checks are possible.
+
+    Return measurements by keys like "parse typed_ast statements", and a list of
+    human-readable descriptions of cases which scale worse than allowed.
+    """
+    results = {}
+    violations = []
+    for operation in operations:
+        for backend in backends:
+            for scenario in scenarios:
+                sizes = sorted({max(round(size * scale), 1) for size in SIZES[scenario]})
+                name = '{} {} {}'.format(operation, backend, scenario)
+                results[name] = measure_scaling(operation, backend, scenario, sizes, repeat)
+                exponent = results[name]['exponent']
+                if exponent > max_exponent:
+                    violations.append('{}: runtime ~ size ** {:.2f}, above limit of {:.2f}'
+                                      .format(name, exponent, max_exponent))
+    return results, violations
@@ -28,6 +28,46 @@ def prepare_examples(templates: t.Mapping[str, str]) -> t.Dict[str, str]:
     return examples
 
 
+def prepare_synthetic_example(
+        statements: int, comments: int = 0, depth: int = 1, multiline: bool = False) -> str:
+    """Generate a module with given numbers of statements and comments and given nesting depth.
+
+    Statements form chains of nested for loops, each chain ending with an assignment
+    at nesting depth - 1. If multiline is True, assignments span several lines.
+    Comments are spread evenly over statements: every other comment is placed at the end
+    of a statement (if it has no such comment yet), and all others in separate lines.
+    """
+    assert statements > 0, statements
+    assert depth > 0, depth
+    comments_per_statement = [0] * statements
+    for i in range(comments):
+        comments_per_statement[i * statements // comments] += 1
+    lines = []
+    comment_number = 0
+    for index in range(statements):
+        level = index % depth
+        indent = '    ' * level
+        if level < depth - 1 and index < statements - 1:
+            statement_lines = ['{}for i_{} in range({}):'.format(indent, index, index)]
+        elif multiline:
+            statement_lines = [
+                '{}a_{} = call('.format(indent, index),
+                '{}    a_{},'.format(indent, index - 1),
+                '{}    {})'.format(indent, index)]
+        else:
+            statement_lines = ['{}a_{} = a_{} + {}'.format(indent, index, index - 1, index)]
+        has_eol_comment = False
+        for _ in range(comments_per_statement[index]):
+            if comment_number % 2 and not has_eol_comment:
+                statement_lines[-1] += '  # comment {}'.format(comment_number)
+                has_eol_comment = True
+            else:
+                lines.append('{}# comment {}'.format(indent, comment_number))
+            comment_number += 1
+        lines += statement_lines
+    return '\n'.join(lines) + '\n'
+
+
 TEMPLATES = {
     'empty': """""",
     '1 assignment': """a = 1""",
@@ -2,12 +2,19 @@
 
 import itertools
 import unittest
+import unittest.mock
 
 import typed_ast.ast3
 
-from horast.token_tools import get_comment_tokens
-from horast.ast_tools import ast_to_list
-from horast.ast_comments import insert_comment_tokens, insert_comment_tokens_approx
+from horast.nodes import Comment, Directive, Pragma, OpenMpPragma, Include
+from horast.token_tools import \
+    get_tokens, get_comment_tokens, filter_comment_tokens, has_only_module_level_comments
+from horast.ast_tools import ast_to_list, get_ast_node_scopes
+from horast.ast_comments import \
+    classify_comment_token, register_directive, unregister_directive, \
+    insert_comment_tokens, insert_module_level_comment_tokens, insert_comment_tokens_approx
+from horast.parser import parse
+from horast.unparser import DIRECTIVE_PREFIXES, unparse
 from .examples import EXAMPLES
 
 
@@ -28,6 +35,82 @@ class Tests(unittest.TestCase):
                 expected_count = max(1 if comments else 0, len(non_comment_nodes)) + len(comments)
                 self.assertEqual(len(nodes), expected_count, (nodes, non_comment_nodes, comments))
 
+    def test_comment_tokens_scopes_computed_once(self):
+        example = '# one\na = 1\n# two\nb = 2  # three\n# four'
+        with unittest.mock.patch(
+                'horast.ast_comments.get_ast_node_scopes', wraps=get_ast_node_scopes) as mocked:
+            insert_comment_tokens(
+                example, typed_ast.ast3.parse(example), get_comment_tokens(example))
+        self.assertEqual(mocked.call_count, 1)
+
+    def test_comment_tokens_bulk(self):
+        for name, example in EXAMPLES.items():
+            if ' with eol comments' in name or name.startswith('multiline '):
+                continue
+            with self.subTest(name=name, example=example):
+                comments = get_comment_tokens(example)
+                tree = insert_comment_tokens(
+                    example, typed_ast.ast3.parse(example), comments, bulk=True)
+                reference_tree = insert_comment_tokens(
+                    example, typed_ast.ast3.parse(example), comments, bulk=False)
+                self.assertEqual(typed_ast.ast3.dump(tree), typed_ast.ast3.dump(reference_tree))
+                inserted = [_.comment for _ in ast_to_list(tree) if isinstance(_, Comment)]
+                self.assertEqual(inserted, [_.string[1:] for _ in comments])
+
+    def test_module_level_comment_tokens(self):
+        for name, example in EXAMPLES.items():
+            tokens = get_tokens(example)
+            if not has_only_module_level_comments(tokens):
+                continue
+            with self.subTest(name=name, example=example):
+                comments = filter_comment_tokens(tokens)
+                tree = insert_module_level_comment_tokens(typed_ast.ast3.parse(example), comments)
+                reference_tree = insert_comment_tokens(
+                    example, typed_ast.ast3.parse(example), comments)
+                self.assertEqual(typed_ast.ast3.dump(tree), typed_ast.ast3.dump(reference_tree))
+
+    def test_classify_comment_token(self):
+        examples = {
+            '# comment': Comment, '#if': Directive, '#ifdef A': Directive, '#ifx': Comment,
+            '#if(A)': Directive, '# pragma:once': Pragma, '# pragma: ompx': Pragma,
+            '# pragma: omp parallel': OpenMpPragma, '# pragma: omp': OpenMpPragma,
+            '# include: <cstdio>': Include, '#  pragma: omp': Comment}
+        for example, node_type in examples.items():
+            with self.subTest(example=example):
+                token, = get_comment_tokens(example)
+                self.assertIs(classify_comment_token(token), node_type)
+
+    def test_register_directive(self):
+
+        class CustomPragma(Pragma):
+            _comment_prefixes = (' pragma: custom',)
+
+        class CustomPragmaExtension(CustomPragma):
+            _comment_prefixes = (' pragma: custom extension',)
+
+        code = '# pragma: custom x\n# pragma: custom extension y\n# pragma: customize\n'
+        self.assertIs(register_directive(CustomPragma), CustomPragma)
+        register_directive(CustomPragmaExtension)
+        try:
+            tree = parse(code)
+            self.assertListEqual([type(_) for _ in tree.body],
+                                 [CustomPragma, CustomPragmaExtension, Pragma])
+            self.assertListEqual([_.expr for _ in tree.body[:2]], ['x', 'y'])
+            self.assertEqual(unparse(tree), '\n' + code)
+            self.assertNotIn(CustomPragma, DIRECTIVE_PREFIXES)
+            with self.assertRaises(ValueError):
+                register_directive(type('Conflicting', (Pragma,), {
+                    '_comment_prefixes': (' pragma: custom',)}))
+        finally:
+            unregister_directive(CustomPragma)
+            unregister_directive(CustomPragmaExtension)
+        token, = get_comment_tokens('# pragma: custom x\n')
+        self.assertIs(classify_comment_token(token), Pragma)
+        with self.assertRaises(ValueError):
+            register_directive(type('Inheriting', (Pragma,), {}))
+        with self.assertRaises(TypeError):
+            register_directive(Comment)
+
     def test_comment_tokens_approx(self):
         for (name, example), only_localizable in itertools.product(EXAMPLES.items(), (False, True)):
             # for only_localizable in:
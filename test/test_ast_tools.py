@@ -1,13 +1,15 @@
 """Unit tests for ast_tools module."""
 
+import ast
 import unittest
 
 import typed_ast.ast3
 
+from horast.nodes import Comment
 from horast.token_tools import Scope, get_comment_tokens, get_token_scope
 from horast.ast_tools import \
     ast_to_list, get_ast_node_locations, convert_1d_str_index_to_2d, get_ast_node_scopes, \
-    find_in_ast
+    ScopeIndex, ParentIndex, node_path_in_ast, find_in_ast, insert_in_tree
 from .examples import EXAMPLES
 
 
@@ -43,6 +45,9 @@ class Tests(unittest.TestCase):
             for index in range(len(text) + 1):
                 with self.subTest(text=text, index=index):
                     location = convert_1d_str_index_to_2d(text, index)
+                    self.assertEqual(convert_1d_str_index_to_2d(
+                        text, index, newline_starts=[
+                            i + 1 for i, char in enumerate(text) if char == '\n']), location)
                     lineno, col_offset = location
                     self.assertGreaterEqual(lineno, 1, location)
                     self.assertGreaterEqual(col_offset, 0, location)
@@ -79,6 +84,78 @@ class Tests(unittest.TestCase):
                     self.assertEqual(scope.start, location, '{} in: """\n{}\n"""'.format(
                         typed_ast.ast3.dump(node), example))
 
+    def test_get_ast_node_scopes_from_positions(self):
+        for name, example in EXAMPLES.items():
+            with self.subTest(name=name, example=example):
+                typed_nodes = ast_to_list(typed_ast.ast3.parse(example))
+                typed_scopes = get_ast_node_scopes(example, typed_nodes)
+                nodes = ast_to_list(ast.parse(example))
+                scopes = get_ast_node_scopes(example, nodes)
+                self.assertEqual(len(scopes), len(nodes))
+                if nodes[0].body:
+                    self.assertEqual(scopes[0], typed_scopes[0])
+                for node, scope in zip(nodes, scopes):
+                    if isinstance(node, ast.stmt):
+                        self.assertEqual(scope.end, (node.end_lineno, node.end_col_offset))
+
+    def test_scope_index(self):
+        for name, example in EXAMPLES.items():
+            tree = typed_ast.ast3.parse(example)
+            nodes = ast_to_list(tree)
+            scopes = get_ast_node_scopes(example, nodes)
+            scope_index = ScopeIndex(nodes, scopes)
+            self.assertEqual(len(scope_index), len(nodes))
+            for index in range(0, len(example) + 1, 7):
+                for end_index in range(index, len(example) + 1, 11):
+                    target = Scope(convert_1d_str_index_to_2d(example, index),
+                                   convert_1d_str_index_to_2d(example, end_index))
+                    with self.subTest(name=name, example=example, target=target):
+                        after = [i for i, _ in enumerate(scopes) if _.start > target.end]
+                        first_after = scope_index.first_after(target.end)
+                        if after:
+                            self.assertIsNotNone(first_after)
+                            self.assertEqual(
+                                scopes[first_after].start, min(scopes[_].start for _ in after))
+                        else:
+                            self.assertIsNone(first_after)
+                        before = [i for i, _ in enumerate(scopes) if _.end < target.start]
+                        last_before = scope_index.last_before(target.start)
+                        if before:
+                            self.assertIsNotNone(last_before)
+                            self.assertEqual(
+                                scopes[last_before].end, max(scopes[_].end for _ in before))
+                        else:
+                            self.assertIsNone(last_before)
+                        within = [i for i, _ in enumerate(scopes)
+                                  if _.start <= target.start and _.end > target.end]
+                        container = scope_index.innermost_container(target)
+                        if within:
+                            self.assertIn(container, within)
+                            for i in within:
+                                self.assertGreaterEqual(scopes[i].end, scopes[container].end)
+                                self.assertLessEqual(scopes[i].start, scopes[container].start)
+                        else:
+                            self.assertIsNone(container)
+
+    def test_parent_index(self):
+        for name, example in EXAMPLES.items():
+            with self.subTest(name=name, example=example):
+                tree = typed_ast.ast3.parse(example)
+                parent_index = ParentIndex(tree)
+                for node in ast_to_list(tree, only_localizable=True):
+                    self.assertIn(node, parent_index)
+                    self.assertEqual(
+                        parent_index.path(node), node_path_in_ast(tree, node),
+                        typed_ast.ast3.dump(node))
+                for node in ast_to_list(tree, only_localizable=True)[::-1]:
+                    if isinstance(node, typed_ast.ast3.stmt):
+                        insert_in_tree(tree, Comment(' c', False), node, True,
+                                       parent_index=parent_index)
+                for node in ast_to_list(tree, only_localizable=True):
+                    self.assertEqual(parent_index.path(node), node_path_in_ast(tree, node))
+                with self.assertRaises(ValueError):
+                    parent_index.path(Comment(' not in tree', False))
+
     def test_find_in_ast(self):
         for name, example in EXAMPLES.items():
             if ' with eol comments' in name or name.startswith('multiline '):
@@ -0,0 +1,77 @@
+"""Unit tests for batch module."""
+
+import pathlib
+import tempfile
+import unittest
+
+from horast.parser import parse
+from horast.unparser import unparse
+from horast.batch import parse_many
+from .examples import EXAMPLES
+
+
+class Tests(unittest.TestCase):
+
+    def test_parse_many(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            codes = {}
+            for i, example in enumerate(EXAMPLES.values()):
+                path = pathlib.Path(tmpdir, 'example_{}.py'.format(i))
+                path.write_text(example)
+                codes[path] = example
+            broken_path = pathlib.Path(tmpdir, 'broken.py')
+            broken_path.write_text('def broken(:\n    pass\n')
+            paths = list(codes) + [broken_path]
+            for workers, chunksize, ordered in [(1, 1, True), (2, 1, False), (2, 7, True)]:
+                with self.subTest(workers=workers, chunksize=chunksize, ordered=ordered):
+                    results = list(parse_many(
+                        paths, workers=workers, chunksize=chunksize, ordered=ordered))
+                    self.assertEqual(len(results), len(paths))
+                    if ordered:
+                        self.assertListEqual([_.path for _ in results], paths)
+                    for path, tree, error in results:
+                        if path == broken_path:
+                            self.assertIsNone(tree)
+                            self.assertIsInstance(error, SyntaxError)
+                            continue
+                        try:
+                            expected = unparse(parse(codes[path]))
+                        except (SyntaxError, NotImplementedError) as err:
+                            self.assertIsInstance(error, type(err))
+                            continue
+                        self.assertIsNone(error)
+                        self.assertEqual(unparse(tree), expected)
+
+    def test_parse_many_bad_arguments(self):
+        with self.assertRaises(ValueError):
+            parse_many([], chunksize=0)
+        with self.assertRaises(ValueError):
+            parse_many([], workers=0)
+
+    def test_parse_many_unserializable_tree(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            deep_path = pathlib.Path(tmpdir, 'deep.py')
+            deep_path.write_text('x = {}\n'.format('+'.join(['1'] * 400)))
+            paths = [pathlib.Path(tmpdir, 'a.py'), deep_path, pathlib.Path(tmpdir, 'b.py')]
+            paths[0].write_text('a = 1  # one\n')
+            paths[2].write_text('b = 2  # two\n')
+            parse(deep_path.read_text())
+            results = list(parse_many(paths, workers=2, chunksize=3, ordered=True))
+            self.assertListEqual([_.path for _ in results], paths)
+            self.assertEqual(unparse(results[0].tree).strip(), 'a = 1  # one')
+            self.assertIsNone(results[1].tree)
+            self.assertIsInstance(results[1].error, RecursionError)
+            self.assertEqual(unparse(results[2].tree).strip(), 'b = 2  # two')
+
+    def test_parse_many_failed_chunk(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            paths = [pathlib.Path(tmpdir, 'example_{}.py'.format(i)) for i in range(4)]
+            for path in paths:
+                path.write_text('a = 1\n')
+            # arguments that cannot be sent to the workers make whole chunks fail
+            results = list(parse_many(paths, workers=2, chunksize=2, unpicklable=lambda: None))
+            self.assertSetEqual({_.path for _ in results}, set(paths))
+            for path, tree, error in results:
+                with self.subTest(path=path):
+                    self.assertIsNone(tree)
+                    self.assertIsInstance(error, Exception)
@@ -0,0 +1,119 @@
+"""Unit tests for benchmarks package."""
+
+import ast
+import copy
+import pathlib
+import tempfile
+import unittest
+
+from .benchmarks import (
+    BACKENDS, BASELINE_PATH, METRICS, OPERATIONS, compare_results, load_corpus, percentile,
+    read_results, run_benchmarks, write_results)
+from .benchmarks.__main__ import main
+from .benchmarks.memory import MIN_SAVING, check_memory
+from .benchmarks.scaling import SCENARIOS, check_scaling, fit_exponent
+from .examples import prepare_synthetic_example
+
+
+class Tests(unittest.TestCase):
+
+    def test_percentile(self):
+        values = [5, 1, 4, 2, 3]
+        for rank, expected in ((0, 1), (20, 1), (50, 3), (90, 5), (99, 5), (100, 5)):
+            with self.subTest(rank=rank):
+                self.assertEqual(percentile(values, rank), expected)
+        with self.assertRaises(ValueError):
+            percentile([], 50)
+
+    def test_run_benchmarks(self):
+        corpus = load_corpus()
+        self.assertGreaterEqual(len(corpus), 4)
+        small_corpus = {'nested_expressions.py': corpus['nested_expressions.py']}
+        results = run_benchmarks(small_corpus, repeat=1)
+        self.assertSetEqual(
+            set(results['results']),
+            {'{} {}'.format(operation, backend)
+             for operation in OPERATIONS for backend in BACKENDS})
+        for name, metrics in results['results'].items():
+            for metric in METRICS:
+                with self.subTest(name=name, metric=metric):
+                    self.assertGreater(metrics[metric], 0)
+        with tempfile.TemporaryDirectory() as directory:
+            path = pathlib.Path(directory, 'results.json')
+            write_results(results, path)
+            self.assertDictEqual(read_results(path), results)
+
+    def test_compare_results(self):
+        baseline = read_results(BASELINE_PATH)
+        self.assertListEqual(compare_results(baseline, baseline), [])
+        current = copy.deepcopy(baseline)
+        current['results']['parse typed_ast']['lines_per_s'] *= 0.5
+        current['results']['unparse ast']['peak_memory'] *= 1.1
+        current['results']['unparse ast']['latency_p99'] *= 2
+        del current['results']['validate ast']
+        regressions = compare_results(baseline, current)
+        self.assertEqual(len(regressions), 2, msg=regressions)
+        self.assertTrue(regressions[0].startswith('parse typed_ast: lines_per_s regressed'))
+        self.assertTrue(regressions[1].startswith('unparse ast: latency_p99 regressed'))
+        self.assertListEqual(compare_results(baseline, current, tolerance=1.5), [])
+
+    def test_main(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = pathlib.Path(directory, 'results.json')
+            self.assertEqual(main(['run', '--repeat', '1', '--operation', 'parse', '--backend',
+                                   'typed_ast', '--output', str(path)]), 0)
+            self.assertSetEqual(set(read_results(path)['results']), {'parse typed_ast'})
+            self.assertEqual(main(['compare', str(path), '--tolerance', '1000']), 0)
+            self.assertEqual(main(['compare', str(path), '--baseline', str(path)]), 0)
+        self.assertEqual(main(['memory', '--comments', '100']), 0)
+
+    def test_prepare_synthetic_example(self):
+        for statements, comments, depth, multiline in (
+                (1, 0, 1, False), (7, 9, 3, True), (10, 3, 1, False), (40, 100, 5, True)):
+            with self.subTest(statements=statements, comments=comments, depth=depth,
+                              multiline=multiline):
+                code = prepare_synthetic_example(statements, comments, depth, multiline)
+                tree = ast.parse(code)
+                self.assertEqual(
+                    sum(isinstance(node, ast.stmt) for node in ast.walk(tree)), statements)
+                self.assertEqual(code.count('#'), comments)
+                indents = [len(line) - len(line.lstrip()) for line in code.splitlines()]
+                self.assertEqual(max(indents), 4 * (min(depth, statements) - 1 + multiline))
+
+    def test_fit_exponent(self):
+        sizes = [10, 20, 40, 80]
+        for exponent in (0, 0.5, 1, 2, 3):
+            with self.subTest(exponent=exponent):
+                times = [0.001 * size ** exponent for size in sizes]
+                self.assertAlmostEqual(fit_exponent(sizes, times), exponent)
+        with self.assertRaises(ValueError):
+            fit_exponent([10], [0.1])
+
+    def test_check_scaling(self):
+        # wall-clock exponents are too noisy to be checked here, see "scaling" command instead
+        results, violations = check_scaling(
+            max_exponent=float('inf'), scale=0.25, backends=('typed_ast',), repeat=1)
+        self.assertSetEqual(
+            set(results), {'{} typed_ast {}'.format(operation, scenario)
+                           for operation in ('parse', 'unparse') for scenario in SCENARIOS})
+        self.assertListEqual(violations, [], msg=results)
+        for name, result in results.items():
+            with self.subTest(name=name):
+                self.assertGreater(len(result['sizes']), 1)
+                self.assertEqual(len(result['times']), len(result['sizes']))
+                self.assertTrue(all(time > 0 for time in result['times']))
+                self.assertIsInstance(result['exponent'], float)
+        _, violations = check_scaling(
+            max_exponent=-1, operations=('unparse',), backends=BACKENDS[-1:],
+            scenarios=('statements',), scale=0.1)
+        self.assertEqual(len(violations), 1)
+        self.assertTrue(violations[0].startswith(
+            'unparse {} statements: runtime ~ size **'.format(BACKENDS[-1])))
+
+    def test_check_memory(self):
+        results, violations = check_memory(comments=5000)
+        self.assertListEqual(violations, [], msg=results)
+        self.assertLess(results['slotted'], results['unslotted'] * (1 - MIN_SAVING))
+        _, violations = check_memory(comments=100, min_saving=1)
+        self.assertEqual(len(violations), 1)
+        self.assertTrue(violations[0].startswith('slotted nodes of 100 comments take'))
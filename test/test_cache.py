@@ -0,0 +1,226 @@
+"""Unit tests for cache module."""
+
+import os
+import pathlib
+import tempfile
+import threading
+import unittest
+import unittest.mock
+
+from horast.nodes import Pragma
+from horast.parser import parse
+from horast.unparser import unparse
+from horast.ast_comments import register_directive, unregister_directive
+from horast.cache import ParseCache, MemoryCache
+from .examples import EXAMPLES
+
+
+class CustomPragma(Pragma):
+    _comment_prefixes = (' pragma: custom',)
+
+
+class Tests(unittest.TestCase):
+
+    def test_parse(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = ParseCache(tmpdir)
+            for name, example in EXAMPLES.items():
+                try:
+                    expected = unparse(parse(example))
+                except (SyntaxError, NotImplementedError):
+                    continue
+                with self.subTest(name=name, example=example):
+                    self.assertEqual(unparse(cache.parse(example)), expected)
+                    with unittest.mock.patch('horast.cache.parse') as mocked:
+                        tree = cache.parse(example)
+                    mocked.assert_not_called()
+                    self.assertEqual(unparse(tree), expected)
+                    self.assertEqual(unparse(ParseCache(tmpdir).parse(example)), expected)
+
+    def test_key(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = ParseCache(tmpdir)
+            code = 'print(1)  # one\n'
+            keys = {
+                cache.key(code), cache.key(code + '\n'), cache.key(code, backend='ast'),
+                cache.key(code, mode='single'), cache.key(code, '<unknown>', 'single')}
+            self.assertEqual(len(keys), 5)
+            self.assertEqual(cache.key(code), cache.key(code))
+            with unittest.mock.patch(
+                    'horast.cache._implementation_fingerprint', return_value='changed'):
+                self.assertNotEqual(ParseCache(tmpdir).key(code), cache.key(code))
+
+    def test_registered_directives(self):
+        code = '# pragma: custom x\n'
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for cache in (ParseCache(tmpdir), MemoryCache()):
+                with self.subTest(cache=cache):
+                    self.assertIs(type(cache.parse(code).body[0]), Pragma)
+                    register_directive(CustomPragma)
+                    try:
+                        self.assertIs(type(cache.parse(code).body[0]), CustomPragma)
+                        self.assertIs(type(cache.parse(code).body[0]), CustomPragma)
+                    finally:
+                        unregister_directive(CustomPragma)
+                    self.assertIs(type(cache.parse(code).body[0]), Pragma)
+                    if isinstance(cache, MemoryCache):
+                        self.assertEqual((cache.hits, cache.misses), (2, 2))
+
+    def test_parse_file(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = pathlib.Path(tmpdir, 'code.py')
+            path.write_text('a = 1  # one\n')
+            cache = ParseCache(pathlib.Path(tmpdir, 'cache'))
+            self.assertEqual(unparse(cache.parse_file(path)).strip(), 'a = 1  # one')
+            self.assertEqual(len(list(cache.path.glob('*/*.pickle'))), 1)
+
+    def test_evict(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = ParseCache(tmpdir)
+            for i in range(8):
+                cache.parse('a = {}  # {}\n'.format(i, i))
+            entries = list(cache.path.glob('*/*.pickle'))
+            self.assertEqual(len(entries), 8)
+            entry_size = max(_.stat().st_size for _ in entries)
+            for entry in entries:
+                os.utime(str(entry), (0, 0))
+            cache = ParseCache(tmpdir, max_size=3 * entry_size)
+            cache.parse('a = 1  # new\n')
+            self.assertLessEqual(len(list(cache.path.glob('*/*.pickle'))), 3)
+            self.assertIsNotNone(cache.get(cache.key('a = 1  # new\n')))
+            cache.clear()
+            self.assertEqual(len(list(cache.path.glob('*/*.pickle'))), 0)
+
+    def test_evict_rarely(self):
+        codes = ['a_{:04d} = 1\n'.format(i) for i in range(300)]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = ParseCache(tmpdir)
+            cache.parse(codes[0])
+            entry_size = cache._size  # pylint: disable=protected-access
+            cache = ParseCache(tmpdir, max_size=100 * entry_size)
+            with unittest.mock.patch.object(cache, 'evict', wraps=cache.evict) as mocked:
+                for code in codes:
+                    cache.parse(code)
+            self.assertLessEqual(cache._size, cache.max_size)  # pylint: disable=protected-access
+            self.assertGreater(mocked.call_count, 0)
+            self.assertLessEqual(mocked.call_count, len(codes) // 10)
+
+    def test_size(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = ParseCache(tmpdir)
+            code = 'a = 1  # one\n'
+            for _ in range(3):
+                cache.put(cache.key(code), parse(code))
+            cache.parse('b = 2  # two\n')
+            self.assertEqual(
+                cache._size,  # pylint: disable=protected-access
+                sum(_.stat().st_size for _ in cache.path.glob('*/*.pickle')))
+
+    def test_unpicklable_tree(self):
+        code = 'x = {}\n'.format('+'.join(['1'] * 400))
+        expected = unparse(parse(code))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = ParseCache(tmpdir)
+            self.assertEqual(unparse(cache.parse(code)), expected)
+            self.assertEqual(len(list(cache.path.glob('*/*'))), 0)
+            self.assertEqual(unparse(cache.parse(code)), expected)
+
+    def test_unpicklable_directive(self):
+
+        @register_directive
+        class LocalPragma(Pragma):
+            _comment_prefixes = (' local:',)
+
+        code = '# local: x\npass\n'
+        try:
+            with tempfile.TemporaryDirectory() as tmpdir:
+                cache = ParseCache(tmpdir)
+                self.assertIs(type(cache.parse(code).body[0]), LocalPragma)
+                self.assertEqual(len(list(cache.path.glob('*/*'))), 0)
+                self.assertIs(type(cache.parse(code).body[0]), LocalPragma)
+        finally:
+            unregister_directive(LocalPragma)
+
+    def test_unreadable_entry(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = ParseCache(tmpdir)
+            code = 'a = 1  # one\n'
+            cache.parse(code)
+            key = cache.key(code)
+            cache.path.joinpath(key[:2], '{}.pickle'.format(key)).write_bytes(b'broken')
+            with self.assertLogs('horast.cache', level='WARNING'):
+                self.assertIsNone(cache.get(key))
+            self.assertEqual(unparse(cache.parse(code)).strip(), code.strip())
+
+    def test_memory_cache_parse(self):
+        cache = MemoryCache()
+        code = 'a = 1  # one\n'
+        tree = cache.parse(code)
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+        tree.body.clear()
+        with unittest.mock.patch('horast.cache.parse') as mocked:
+            other_tree = cache.parse(code)
+        mocked.assert_not_called()
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertIsNot(other_tree, tree)
+        self.assertEqual(unparse(other_tree).strip(), code.strip())
+        cache.parse(code, mode='single')
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+        cache.clear()
+        self.assertEqual((len(cache), cache.size, cache.hits, cache.misses), (0, 0, 0, 0))
+
+    def test_memory_cache_unpicklable_tree(self):
+        cache = MemoryCache()
+        code = 'x = {}\n'.format('+'.join(['1'] * 400))
+        expected = unparse(parse(code))
+        self.assertEqual(unparse(cache.parse(code)), expected)
+        self.assertEqual((len(cache), cache.size), (0, 0))
+        self.assertEqual(unparse(cache.parse(code)), expected)
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+
+    def test_memory_cache_unpicklable_directive(self):
+
+        @register_directive
+        class LocalPragma(Pragma):
+            _comment_prefixes = (' local:',)
+
+        cache = MemoryCache()
+        code = '# local: x\npass\n'
+        try:
+            self.assertIs(type(cache.parse(code).body[0]), LocalPragma)
+            self.assertEqual((len(cache), cache.size), (0, 0))
+            self.assertIs(type(cache.parse(code).body[0]), LocalPragma)
+        finally:
+            unregister_directive(LocalPragma)
+
+    def test_memory_cache_limits(self):
+        cache = MemoryCache(max_entries=3)
+        for i in range(5):
+            cache.parse('a = {}  # {}\n'.format(i, i))
+        self.assertEqual(len(cache), 3)
+        cache.parse('a = 4  # 4\n')
+        cache.parse('a = 0  # 0\n')
+        self.assertEqual((cache.hits, cache.misses), (1, 6))
+        cache = MemoryCache(max_size=cache.size // 3)
+        for i in range(5):
+            cache.parse('a = {}  # {}\n'.format(i, i))
+        self.assertLessEqual(cache.size, cache.max_size)
+        self.assertLess(len(cache), 5)
+
+    def test_memory_cache_threads(self):
+        cache = MemoryCache(max_entries=4)
+        codes = ['a = {}  # {}\n'.format(i, i) for i in range(8)]
+        results = []
+
+        def work():
+            for code in codes * 4:
+                results.append(unparse(cache.parse(code)).strip() == code.strip())
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(results), 4 * 4 * 8)
+        self.assertTrue(all(results))
+        self.assertEqual(cache.hits + cache.misses, len(results))
+        self.assertLessEqual(len(cache), 4)
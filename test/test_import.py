@@ -0,0 +1,63 @@
+"""Unit tests for importing horast package."""
+
+import sys
+import unittest
+
+import horast
+import horast.parser
+import horast.unparser
+from horast._version import VERSION
+
+from .benchmarks.import_time import HEAVY_MODULES, measure_import_times
+
+_IMPORT_TIME_SUPPORTED = sys.version_info[:2] >= (3, 7)
+"""Whether "python -X importtime" and lazy members of horast are supported."""
+
+
+class Tests(unittest.TestCase):
+
+    def test_lazy_members(self):
+        self.assertTrue(set(horast.__all__).issubset(dir(horast)))
+        for name in horast.__all__:
+            with self.subTest(name=name):
+                self.assertIsNotNone(getattr(horast, name))
+        self.assertIs(horast.parse, horast.parser.parse)
+        self.assertIs(horast.unparse, horast.unparser.unparse)
+        namespace = {}
+        exec('from horast import *', namespace)
+        self.assertTrue(set(horast.__all__).issubset(namespace))
+        with self.assertRaises(AttributeError):
+            horast.no_such_member  # pylint: disable=pointless-statement
+        with self.assertRaises(ImportError):
+            exec('from horast import no_such_member', {})
+
+    @unittest.skipUnless(_IMPORT_TIME_SUPPORTED, 'requires Python 3.7')
+    def test_static_version(self):
+        self.assertIsInstance(VERSION, str)
+        self.assertNotIn('version_query', measure_import_times('import horast._version'))
+
+    @unittest.skipUnless(_IMPORT_TIME_SUPPORTED, 'requires Python 3.7')
+    def test_import_is_lazy(self):
+        for statement, imported, not_imported in (
+                ('import horast', (), (*HEAVY_MODULES, 'horast.parser')),
+                ('from horast import parse', ('horast.parser', 'typed_ast.ast3'), HEAVY_MODULES),
+                ('from horast import Stats', ('horast.stats',), (*HEAVY_MODULES, 'horast.parser')),
+                ('from horast import unparse', ('horast.unparser', 'static_typing'),
+                 ('horast.ast_validator', 'horast.cache', 'horast.batch'))):
+            import_times = measure_import_times(statement)
+            for module in ('horast', *imported):
+                with self.subTest(statement=statement, module=module):
+                    self.assertIn(module, import_times)
+            for module in not_imported:
+                with self.subTest(statement=statement, module=module):
+                    self.assertNotIn(module, import_times)
+
+    @unittest.skipUnless(_IMPORT_TIME_SUPPORTED, 'requires Python 3.7')
+    def test_import_time(self):
+        heavy_import_times = measure_import_times('import static_typing')
+        heavy_time = heavy_import_times['static_typing'][1]
+        import_times = measure_import_times('import horast')
+        self.assertLess(import_times['horast'][1], heavy_time / 2, msg=import_times['horast'])
+        import_times = measure_import_times('from horast import parse')
+        parse_import_time = import_times['horast'][1] + import_times['horast.parser'][1]
+        self.assertLess(parse_import_time, heavy_time, msg=parse_import_time)
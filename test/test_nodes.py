@@ -1,11 +1,15 @@
 """Unit tests for nodes module."""
 
+import ast
+import copy
 import logging
+import pickle
 import unittest
 
 import typed_ast.ast3
 
-from horast.nodes import Comment
+from horast.nodes import Comment, Directive, OpenMpPragma
+from horast.token_tools import get_comment_tokens
 
 _LOG = logging.getLogger(__name__)
 
@@ -28,3 +32,26 @@ class Tests(unittest.TestCase):
         default_comment = Comment(' comment')
         with self.assertRaises(AttributeError):
             default_comment.eol
+
+    def test_comment_in_both_asts(self):
+        comment = Comment(' comment', False)
+        self.assertIsInstance(comment, typed_ast.ast3.AST)
+        self.assertIsInstance(comment, ast.AST)
+        self.assertEqual(list(ast.iter_fields(comment)), [('comment', ' comment'), ('eol', False)])
+
+    def test_slotted_nodes(self):
+        tokens = get_comment_tokens('a = 1  # noqa\n# pragma: omp parallel\nb = 2  # noqa\n')
+        nodes = [Comment.from_token(tokens[0], None, True), OpenMpPragma.from_token(tokens[1]),
+                 Comment.from_token(tokens[2], None, True), Directive(expr='if', lineno=4)]
+        self.assertIs(nodes[0].comment, nodes[2].comment)
+        nodes[3].custom = 'value'
+        for node in nodes:
+            with self.subTest(node=node):
+                for copied in (copy.deepcopy(node), pickle.loads(pickle.dumps(node))):
+                    self.assertIs(type(copied), type(node))
+                    self.assertEqual(
+                        typed_ast.ast3.dump(copied, include_attributes=True),
+                        typed_ast.ast3.dump(node, include_attributes=True))
+                    self.assertEqual(copied.lineno, node.lineno)
+                    self.assertEqual(vars(copied), vars(node))
+        self.assertEqual(vars(nodes[0]), {})
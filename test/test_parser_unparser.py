@@ -1,14 +1,26 @@
 """Unit tests for parser and unparser modules."""
 
+import ast
+import io
+import itertools
+import logging
+import pathlib
+import sys
+import tempfile
+import tokenize
 import unittest
+import unittest.mock
 
 import typed_ast.ast3
 import typed_astunparse
 
 from horast.ast_tools import ast_to_list
-from horast.nodes import Directive, OpenMpPragma, OpenAccPragma
-from horast.parser import parse
-from horast.unparser import unparse
+from horast.ast_validator import StdlibAstValidator
+from horast.nodes import Comment, Directive, OpenMpPragma, OpenAccPragma
+from horast.parser import \
+    BACKENDS, parse_with_strategy, parse, read_code, parse_file, parse_iter, reparse
+from horast.token_tools import Scope, LineIndex
+from horast.unparser import Unparser, unparse, iter_unparse, unparse_to
 from .examples import EXAMPLES
 
 MODE_RESULTS = {
@@ -54,10 +66,302 @@ class Tests(unittest.TestCase):
                 tree = parse(example)
                 self.assertIsNotNone(tree)
 
+    def test_parse_tokenizes_once(self):
+        code = 'a = 1  # one\n# two\nb = [\n    2,  # three\n    3]\n'
+        with unittest.mock.patch(
+                'tokenize.generate_tokens', wraps=tokenize.generate_tokens) as mocked:
+            tree = parse(code)
+        self.assertEqual(mocked.call_count, 1)
+        self.assertEqual(unparse(tree).strip().count('#'), 3)
+
+    def test_parse_does_not_reparse(self):
+        code = 'call(1, 2, 3, a=1, b=2, c=3)\n# one\n'
+        with unittest.mock.patch('ast.parse', wraps=ast.parse) as mocked:
+            tree = parse(code)
+        self.assertEqual(mocked.call_count, 0)
+        self.assertEqual(unparse(tree).strip(), code.strip())
+
+    def test_parse_does_not_format_debug_messages(self):
+        logger = logging.getLogger('horast')
+        level = logger.level
+        logger.setLevel(logging.INFO)
+        try:
+            for (name, example), (backend, module) in itertools.product(
+                    EXAMPLES.items(), BACKENDS.items()):
+                with self.subTest(name=name, example=example, backend=backend):
+                    with unittest.mock.patch.object(
+                            module, 'dump', wraps=module.dump) as mocked_dump:
+                        try:
+                            parse(example, backend=backend)
+                        except NotImplementedError:
+                            pass
+                    self.assertEqual(mocked_dump.call_count, 0)
+        finally:
+            logger.setLevel(level)
+
+    @unittest.skipUnless('ast' in BACKENDS, 'built-in ast backend requires Python 3.8')
+    def test_parse_backends(self):
+        for name, example in EXAMPLES.items():
+            # comments within multi-line expressions are supported only partially,
+            # but both backends should handle them in the same way
+            supported = not (' with eol comments' in name or name.startswith('multiline '))
+            with self.subTest(name=name, example=example):
+                try:
+                    expected = unparse(parse(example))
+                except NotImplementedError:
+                    self.assertFalse(supported)
+                    with self.assertRaises(NotImplementedError):
+                        parse(example, backend='ast')
+                    continue
+                tree = parse(example, backend='ast')
+                self.assertIsInstance(tree, ast.Module)
+                self.assertNotIsInstance(tree, typed_ast.ast3.AST)
+                if tree.body and supported:
+                    StdlibAstValidator().visit(tree)
+                self.assertEqual(unparse(tree), expected)
+
+    @unittest.skipUnless('ast' in BACKENDS, 'built-in ast backend requires Python 3.8')
+    def test_roundtrip_ast_backend_syntax(self):
+        examples = [
+            'def f(a, /, b):\n    pass', 'def f(a=1, /, b=2, *c, d, e=3, **f):\n    pass',
+            'def f(a, /):\n    pass', '(lambda a, /: 0)', '(lambda a, /, *, b: 0)',
+            'a[1:2, 3]', 'a[:, ::2]', 'a[1, 2]', 'a[1:2,]', 'a[()]', 'a = {**b}',
+            'a = {1: 2, **b, 3: 4}', 'x = (y := 1)', '# one\nb = {**a}  # two']
+        for example in examples:
+            with self.subTest(example=example):
+                tree = parse(example, backend='ast')
+                StdlibAstValidator().visit(tree)
+                self.assertEqual(unparse(tree).strip(), example)
+
+    @unittest.skipUnless(sys.version_info[:2] >= (3, 10), 'match statement requires Python 3.10')
+    def test_unparse_unsupported_ast_backend_syntax(self):
+        examples = ['match a:\n    case 1:\n        pass\n']
+        if sys.version_info[:2] >= (3, 11):
+            examples.append('try:\n    pass\nexcept* E:\n    pass\n')
+        for example in examples:
+            tree = parse(example, backend='ast')
+            with self.subTest(example=example):
+                with self.assertRaises(NotImplementedError):
+                    unparse(tree)
+
+    def test_parse_line_separators(self):
+        code = 'if a:\n    b = 1  # one\nc = (2,  # two\n     3)  # three\n# four\n'
+        for line_separator, backend in itertools.product(('\r\n', '\r'), BACKENDS):
+            with self.subTest(line_separator=line_separator, backend=backend):
+                tree = parse(code.replace('\n', line_separator), backend=backend)
+                self.assertEqual(unparse(tree), unparse(parse(code, backend=backend)))
+
+    def test_parse_unsupported_backend(self):
+        with self.assertRaises(ValueError):
+            parse('a = 1  # one', backend='lib2to3')
+        if 'ast' not in BACKENDS:
+            with self.assertRaisesRegex(ValueError, 'requires Python 3.8'):
+                parse('a = 1  # one', backend='ast')
+
+    def test_parse_strategies(self):
+        examples = {
+            'a = 1\n': 'no comments',
+            'a = 1  # type: int\n': 'no comments',
+            '# a\nb = 1\n# c\n': 'module level',
+            'a = 1  # b\n': 'full',
+            'def f():\n    # a\n    pass\n': 'full'}
+        for (example, expected), backend in itertools.product(examples.items(), BACKENDS):
+            with self.subTest(example=example, backend=backend):
+                tree, strategy = parse_with_strategy(example, backend=backend)
+                self.assertEqual(strategy, expected)
+                self.assertEqual(unparse(tree).strip(), example.strip())
+
+    def test_parse_without_comments_does_not_tokenize(self):
+        with unittest.mock.patch(
+                'tokenize.generate_tokens', wraps=tokenize.generate_tokens) as mocked:
+            parse('a = 1\nb = "text"\n')
+        self.assertEqual(mocked.call_count, 0)
+
+    @unittest.skipUnless('ast' in BACKENDS, 'built-in ast backend requires Python 3.8')
+    def test_parse_with_ast_backend_does_not_tokenize(self):
+        code = 'a = 1  # one\n# two\nb = [\n    2,  # three\n    3]\n'
+        with unittest.mock.patch(
+                'tokenize.generate_tokens', wraps=tokenize.generate_tokens) as mocked:
+            tree = parse(code, backend='ast')
+        self.assertEqual(mocked.call_count, 0)
+        self.assertEqual(unparse(tree), unparse(parse(code)))
+
+    def test_parse_file(self):
+        files = {
+            'plain.py': 'a = 1  # one\n'.encode(),
+            'empty.py': b'',
+            'utf8.py': 'a = "\u017c\u00f3\u0142w"  # \u017c\u00f3\u0142w\n'.encode(),
+            'bom.py': b'\xef\xbb\xbf' + 'a = "\u00e9"  # \u00e9\n'.encode(),
+            'cookie.py': '# -*- coding: latin-1 -*-\na = "\u00e9"  # \u00e9\n'.encode('latin-1')}
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for name, data in files.items():
+                with self.subTest(name=name):
+                    path = pathlib.Path(tmpdir, name)
+                    path.write_bytes(data)
+                    with open(str(path), encoding=tokenize.detect_encoding(
+                            io.BytesIO(data).readline)[0], newline='') as code_file:
+                        code = code_file.read()
+                    self.assertEqual(read_code(path), code)
+                    self.assertEqual(unparse(parse_file(path)), unparse(parse(code)))
+
+    def test_parse_iter(self):
+        for (name, example), (backend, module) in itertools.product(
+                EXAMPLES.items(), BACKENDS.items()):
+            with self.subTest(name=name, example=example, backend=backend):
+                try:
+                    tree = parse(example, backend=backend)
+                except NotImplementedError:
+                    continue
+                tree.type_ignores = []
+                nodes = list(parse_iter(io.StringIO(example), backend=backend))
+                module_of_nodes = module.Module(body=nodes, type_ignores=[])
+                self.assertEqual(
+                    module.dump(module_of_nodes, include_attributes=True),
+                    module.dump(tree, include_attributes=True))
+
+    def test_parse_iter_end_of_line_comments(self):
+        codes = {
+            'X = 1  # c\ny = 2\n': [False],
+            'X = 1  # c\n\n# d\ny = 2\n': [False, False],
+            'X = 1  # c\n': [True],
+            'X = 1\ny = 2  # c\n': [True]}
+        for code, eols in codes.items():
+            with self.subTest(code=code):
+                self.assertListEqual(
+                    [_.eol for _ in parse(code).body if isinstance(_, Comment)], eols)
+                self.assertListEqual(
+                    [_.eol for _ in parse_iter(io.StringIO(code)) if isinstance(_, Comment)], eols)
+
+    def test_parse_iter_reads_incrementally(self):
+        code = '# one\na = 1\n\n@d\ndef f():\n    pass  # two\n\nb = 2\nc = 3\n'
+        stream = io.StringIO(code)
+        nodes = parse_iter(stream)
+        self.assertIsInstance(next(nodes), Comment)
+        self.assertIsInstance(next(nodes), typed_ast.ast3.Assign)
+        self.assertLess(stream.tell(), len(code))
+        function = next(nodes)
+        self.assertIsInstance(function, typed_ast.ast3.FunctionDef)
+        self.assertEqual(function.body[0].lineno, 6)
+        self.assertListEqual(
+            [type(_) for _ in nodes], [Comment, typed_ast.ast3.Assign, typed_ast.ast3.Assign])
+
+    def test_reparse(self):
+        code = 'import a  # type: ignore\n\n# one\n@d\ndef f():\n    pass  # two\n\nb = 1\nc = 2\n'
+        edits = {
+            'insert first line': (((1, 0), (1, 0)), '# zero\n'),
+            'insert into decorated': (((6, 0), (6, 0)), '    # three\n    f()\n'),
+            'replace statement': (((8, 0), (8, 5)), 'b = [\n    2]  # type: ignore'),
+            'delete lines': (((3, 0), (8, 0)), ''),
+            'append': (((10, 0), (10, 0)), 'd = 3  # four\n'),
+            'edit before statement': (((8, 4), (8, 5)), '7  # five'),
+            'unparsable': (((5, 0), (5, 0)), '(')}
+        line_index = LineIndex(code)
+        for (name, (edit_range, text)), (backend, module) in itertools.product(
+                edits.items(), BACKENDS.items()):
+            with self.subTest(name=name, backend=backend):
+                new_code = ''.join([code[:line_index.to_1d(*edit_range[0])], text,
+                                    code[line_index.to_1d(*edit_range[1]):]])
+                old_tree = parse(code, backend=backend)
+                unchanged = old_tree.body[-1]
+                if name == 'unparsable':
+                    with self.assertRaises(SyntaxError):
+                        reparse(old_tree, code, new_code, Scope(*edit_range))
+                    continue
+                tree = reparse(old_tree, code, new_code, Scope(*edit_range))
+                self.assertEqual(
+                    module.dump(tree, include_attributes=True),
+                    module.dump(parse(new_code, backend=backend), include_attributes=True))
+                if name != 'append':
+                    self.assertIn(unchanged, tree.body)
+        old_tree = parse(code)
+        for edit_range, new_code in (
+                (((2, 0), (1, 0)), code), (((1, 0), (1, 0)), code[1:]), (((12, 0), (12, 0)), code),
+                (((1, 0), (1, 200)), code)):
+            with self.subTest(edit_range=edit_range, new_code=new_code):
+                with self.assertRaises(ValueError):
+                    reparse(old_tree, code, new_code, Scope(*edit_range))
+
     def test_parse_failure(self):
         with self.assertRaises(SyntaxError):
             parse('def ill_pass(): pass', mode='eval')
 
+    def test_iter_unparse(self):
+        for (name, example), backend in itertools.product(EXAMPLES.items(), BACKENDS):
+            with self.subTest(name=name, example=example, backend=backend):
+                try:
+                    tree = parse(example, backend=backend)
+                except NotImplementedError:
+                    continue
+                code = unparse(tree)
+                parts = list(iter_unparse(tree))
+                self.assertEqual(len(parts), len(tree.body) + 1)
+                self.assertEqual(''.join(parts), code)
+                stream = io.StringIO()
+                unparse_to(tree, stream)
+                self.assertEqual(stream.getvalue(), code)
+        expression = parse('a + 1', mode='eval')
+        self.assertListEqual(list(iter_unparse(expression)), [unparse(expression)])
+
+    def test_unparser_dispatch_table(self):
+
+        class CommentHidingUnparser(Unparser):
+
+            def _Comment(self, node):
+                pass
+
+        tree = parse('a = 1  # one\n# pragma: omp parallel\n')
+        stream = io.StringIO()
+        CommentHidingUnparser(tree, file=stream)
+        self.assertEqual(stream.getvalue(), '\na = 1\n# pragma: omp parallel\n')
+        self.assertEqual(unparse(tree), '\na = 1  # one\n# pragma: omp parallel\n')
+        self.assertIsNot(CommentHidingUnparser._dispatch_table, Unparser._dispatch_table)
+        self.assertIn(typed_ast.ast3.Assign, Unparser._dispatch_table)
+        self.assertIn(OpenMpPragma, Unparser._dispatch_table)
+
+    def test_unparser_hooks(self):
+
+        class UppercaseDirectiveUnparser(Unparser):
+
+            def _generic_Directive(self, node, prefix: str = ''):
+                self.fill('#' + prefix.upper())
+                self.write(node.expr)
+
+        class UppercasePragmaUnparser(Unparser):
+
+            def _generic_Pragma(self, node, prefix: str = ''):
+                self._generic_Directive(node, ' PRAGMA: ' + prefix.upper())
+
+        class RecordingUnparser(Unparser):
+
+            def __init__(self, *args, **kwargs):
+                self.written = []
+                super().__init__(*args, **kwargs)
+
+            def fill(self, text=''):
+                self.written.append('\n' + '    ' * self._indent + text)
+                super().fill(text)
+
+            def write(self, text):
+                self.written.append(text)
+                super().write(text)
+
+        code = '# one\na = 1  # two\n#if x\n# pragma: omp parallel\n# include: y\n'
+        tree = parse(code)
+        stream = io.StringIO()
+        UppercaseDirectiveUnparser(tree, file=stream)
+        self.assertEqual(
+            stream.getvalue(),
+            '\n# one\na = 1  # two\n#if x\n# PRAGMA: OMP parallel\n# INCLUDE: y\n')
+        stream = io.StringIO()
+        UppercasePragmaUnparser(tree, file=stream)
+        self.assertEqual(
+            stream.getvalue(),
+            '\n# one\na = 1  # two\n#if x\n# PRAGMA: OMP parallel\n# include: y\n')
+        stream = io.StringIO()
+        recording_unparser = RecordingUnparser(tree, file=stream)
+        self.assertEqual(stream.getvalue(), '\n' + code)
+        self.assertEqual(''.join(recording_unparser.written) + '\n', stream.getvalue())
+
     def test_roundtrip_without_comments(self):
         for name, example in EXAMPLES.items():
             with self.subTest(name=name, example=example):
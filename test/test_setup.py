@@ -124,6 +124,19 @@ class UnitTests(unittest.TestCase):
         result = find_version(get_package_folder_name())
         self.assertIsInstance(result, str)
 
+    def test_version_from_git_description(self):
+        version_from_git_description = import_module_member(
+            'setup', 'version_from_git_description')
+        for description, version in (
+                ('v1.2.3-0-gabc1234', '1.2.3'),
+                ('v1.2.3-4-gabc1234', '1.2.3.post4+gabc1234'),
+                ('v1.2.3-0-gabc1234-dirty', '1.2.3+gabc1234.dirty'),
+                ('v1.2.3-rc1-4-gabc1234-dirty', '1.2.3-rc1.post4+gabc1234.dirty')):
+            with self.subTest(description=description):
+                self.assertEqual(version_from_git_description(description), version)
+        with self.assertRaises(ValueError):
+            version_from_git_description('1.2.3-0-gabc1234')
+
     def test_find_packages(self):
         find_packages = import_module_member('setup_boilerplate', 'find_packages')
         results = find_packages()
@@ -0,0 +1,76 @@
+"""Unit tests for stats module."""
+
+import io
+import threading
+import unittest
+
+from horast.parser import BACKENDS, parse
+from horast.stats import Stats, collect_stats, current_stats
+from horast.unparser import unparse, unparse_to
+
+CODE = '# one\na = 1\n\ndef f():\n    # two\n    pass  # three\n'
+
+
+class Tests(unittest.TestCase):
+
+    def test_parse_stats(self):
+        backends = [_ for _ in ('typed_ast', 'ast') if _ in BACKENDS]
+        self.assertIsNone(current_stats())
+        with collect_stats() as stats:
+            self.assertIs(current_stats(), stats)
+            for backend in backends:
+                parse(CODE, backend=backend)
+            parse('# one\na = 1\n')
+            parse('a = 1\n')
+        self.assertIsNone(current_stats())
+        self.assertDictEqual(dict(stats.strategies),
+                             {'full': len(backends), 'module level': 1, 'no comments': 1})
+        self.assertEqual(stats.counts['comments'], 3 * len(backends) + 1)
+        self.assertEqual(stats.counts['tokenizations'], 2)
+        self.assertEqual(stats.counts['token_marker_builds'], 1)
+        self.assertGreater(stats.counts['nodes'], 0)
+        phases = ['parse', 'get_tokens', 'get_ast_node_scopes', 'find_in_ast', 'node_path_in_ast',
+                  'insert_comments']
+        if 'ast' in backends:
+            phases.append('scan_comment_tokens')
+        for phase in phases:
+            with self.subTest(phase=phase):
+                self.assertGreater(stats.times[phase], 0)
+        self.assertGreaterEqual(stats.times['insert_comments'], stats.times['find_in_ast'])
+        parse(CODE)
+        self.assertEqual(stats.strategies['full'], len(backends))
+
+    def test_unparse_stats(self):
+        tree = parse(CODE)
+        with collect_stats() as stats:
+            code = unparse(tree)
+        self.assertEqual(stats.counts['unparsed_bytes'], len(code))
+        self.assertEqual(stats.unparsed_nodes['Comment'], 3)
+        self.assertEqual(stats.unparsed_nodes['FunctionDef'], 1)
+        self.assertGreater(stats.times['unparse'], 0)
+        with collect_stats(Stats()) as streamed_stats:
+            unparse_to(tree, io.StringIO())
+        self.assertDictEqual(
+            {key: value for key, value in streamed_stats.as_dict().items() if key != 'times'},
+            {key: value for key, value in stats.as_dict().items() if key != 'times'})
+
+    def test_nested_collection(self):
+        outer = Stats()
+        with collect_stats(outer):
+            parse(CODE)
+            with collect_stats() as inner:
+                parse(CODE)
+            with collect_stats(outer):
+                parse(CODE)
+        self.assertEqual(outer.strategies['full'], 2)
+        self.assertEqual(inner.strategies['full'], 1)
+        self.assertSetEqual(set(outer.as_dict()),
+                            {'times', 'counts', 'strategies', 'unparsed_nodes'})
+
+    def test_collection_in_other_thread(self):
+        other_stats = []
+        thread = threading.Thread(target=lambda: other_stats.append(current_stats()))
+        with collect_stats():
+            thread.start()
+            thread.join()
+        self.assertListEqual(other_stats, [None])
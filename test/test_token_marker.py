@@ -0,0 +1,57 @@
+"""Unit tests for token_marker module."""
+
+import unittest
+
+import typed_ast.ast3
+
+from horast.ast_tools import ast_to_list, get_ast_node_locations
+from horast.token_marker import TokenMarker
+from .examples import EXAMPLES
+
+SCOPE_EXAMPLES = {
+    'x = """a\nb"""\n': ('Str', (1, 4), (2, 4)),
+    'x = ("a"\n  "b")\n': ('Str', (1, 5), (2, 5)),
+    'x = "é" + y\n': ('Name', (1, 10), (1, 11)),
+    '@dec\ndef f(): pass\n': ('FunctionDef', (1, 0), (2, 13)),
+    'if a: pass\nelif b: pass\n': ('If', (2, 0), (2, 12)),
+    'f(a, k=1)\n': ('keyword', (1, 5), (1, 8)),
+    'f()\n': ('Call', (1, 0), (1, 3)),
+    'x[1:]\n': ('Subscript', (1, 0), (1, 5)),
+    'a.b\n': ('Attribute', (1, 0), (1, 3)),
+    '[i for i in y]\n': ('ListComp', (1, 0), (1, 14)),
+    'x = (1, 2)\n': ('Tuple', (1, 4), (1, 10)),
+    'async def f():\n    async for x in y: pass\n': ('AsyncFor', (2, 4), (2, 26))}
+
+
+class Tests(unittest.TestCase):
+
+    def test_scopes_of_examples(self):
+        for name, example in EXAMPLES.items():
+            with self.subTest(name=name, example=example):
+                tree = typed_ast.ast3.parse(example)
+                marker = TokenMarker(example)
+                marker.mark(tree)
+                nodes = ast_to_list(tree)
+                for node, location in zip(nodes, get_ast_node_locations(nodes)):
+                    scope = marker.scope(node)
+                    self.assertLessEqual(scope.start, scope.end)
+                    if None not in location:
+                        self.assertEqual(scope.start, location)
+
+    def test_scopes(self):
+        for code, (node_type, start, end) in SCOPE_EXAMPLES.items():
+            with self.subTest(code=code):
+                tree = typed_ast.ast3.parse(code)
+                marker = TokenMarker(code)
+                marker.mark(tree)
+                nodes = [_ for _ in ast_to_list(tree) if type(_).__name__ == node_type]
+                scope = marker.scope(nodes[-1])
+                self.assertEqual((scope.start, scope.end), (start, end))
+
+    def test_unmarked(self):
+        code = 'a = b + c\n'
+        tree = typed_ast.ast3.parse(code)
+        marker = TokenMarker(code)
+        marker.mark(tree)
+        self.assertEqual(tuple(marker.scope(tree.body[0].value.op)), ((1, 0), (1, 0)))
+        self.assertEqual(tuple(marker.scope(tree.body[0].targets[0].ctx)), ((1, 0), (1, 0)))
@@ -1,9 +1,14 @@
 """Unit tests for ast_comments module."""
 
+import io
+import itertools
 import tokenize
 import unittest
+import unittest.mock
 
-from horast.token_tools import get_tokens, get_comment_tokens
+from horast.token_tools import \
+    LineIndex, get_tokens, get_comment_tokens, is_comment, scan_comment_tokens, \
+    has_only_module_level_comments, split_top_level_statements
 from .examples import EXAMPLES
 
 
@@ -25,3 +30,99 @@ class Tests(unittest.TestCase):
                 for token in tokens:
                     self.assertIsInstance(token, tokenize.TokenInfo)
                     self.assertEqual(token.type, tokenize.COMMENT)
+
+    def test_scan_comment_tokens(self):
+        examples = [
+            '"#"  # comment\n', "'#'  # comment", 'r"\\\\"  # comment\n', "'\\''  # comment\n",
+            '"""\n# not comment\n"""  # comment\n', "'''#\n''''#'  # comment\n",
+            'f"{a!r:#x}"  # comment\n', 'b"#"  # comment\r\n# comment\r\n',
+            '"\\\n#"  # comment\n', 'a = 1  # type: int\n', '#\n##\n#!#\n']
+        examples += list(EXAMPLES.values())
+        for example, ignore_type_comments in itertools.product(examples, (False, True)):
+            with self.subTest(example=example, ignore_type_comments=ignore_type_comments):
+                reference = get_tokens(example, lambda _: is_comment(_) and not (
+                    ignore_type_comments and _.string.startswith('# type:')))
+                with unittest.mock.patch(
+                        'horast.token_tools.get_tokens', wraps=get_tokens) as mocked:
+                    tokens = scan_comment_tokens(example, ignore_type_comments)
+                self.assertEqual(mocked.call_count, 0)
+                self.assertListEqual(tokens, reference)
+
+    def test_scan_comment_tokens_fallback(self):
+        for example in ['a = "abc\n# comment\n', 'a = 1\r# comment\r']:
+            with self.subTest(example=example):
+                with unittest.mock.patch(
+                        'horast.token_tools.get_tokens', wraps=get_tokens) as mocked:
+                    tokens = scan_comment_tokens(example)
+                self.assertEqual(mocked.call_count, 1)
+                self.assertListEqual(tokens, get_tokens(example, is_comment))
+
+    def test_has_only_module_level_comments(self):
+        examples = {
+            '': True,
+            'a = 1\n': True,
+            '# a\nb = 1\n# c\n\n# d\ne = 1\n# f': True,
+            'def f():\n    pass\n# a\nb = 1\n': True,
+            'def f():\n    pass\n# a\n': True,
+            'a = 1  # type: int\n# b\n': True,
+            'a = 1  # b\n': False,
+            'def f():\n    # a\n    pass\n': False,
+            'def f():\n    pass\n# a\n    pass\n': False,
+            'if a:\n    pass\n# b\nelse:\n    pass\n': False,
+            '@decorator\n# a\ndef f():\n    pass\n': False,
+            'a = [\n# b\n1]\n': False}
+        for example, expected in examples.items():
+            with self.subTest(example=example):
+                self.assertEqual(has_only_module_level_comments(get_tokens(example)), expected)
+
+    def test_split_top_level_statements(self):
+        examples = {
+            '': [],
+            '# a\n': ['# a\n'],
+            '# a\nb = 1; c = 2\n\n# d\ne = [\n1]\n': ['# a\nb = 1; c = 2\n\n# d\n', 'e = [\n1]\n'],
+            '@a\n# b\n@c\ndef f():\n    pass\n# d\ng = 1': [
+                '@a\n# b\n@c\ndef f():\n    pass\n# d\n', 'g = 1'],
+            'if a:\n    pass\n# b\nelse:\n    pass\nc = """\nd = 1\n"""\n': [
+                'if a:\n    pass\n# b\nelse:\n    pass\n', 'c = """\nd = 1\n"""\n'],
+            'a = 1\nb = (\n': ['a = 1\n', 'b = (\n']}
+        for example, expected in examples.items():
+            with self.subTest(example=example):
+                parts = list(split_top_level_statements(io.StringIO(example).readline))
+                self.assertListEqual([code for _, code in parts], expected)
+                self.assertEqual(''.join(code for _, code in parts), example)
+                linenos = [1]
+                for _, code in parts[:-1]:
+                    linenos.append(linenos[-1] + code.count('\n'))
+                self.assertListEqual([lineno for lineno, _ in parts], linenos[:len(parts)])
+
+    def test_line_index(self):
+        texts = [
+            'def', 'def\n', 'def\nghi', '\ndef\nghi', 'abc\ndef\nghi', '', '\n', '\n\n',
+            'abc\r\ndef\r\nghi', 'abc\rdef\rghi', 'abc\r\ndef\rghi\n', '\r\n\r\r\n']
+        for text in texts:
+            line_index = LineIndex(text)
+            lines = text.splitlines(keepends=True)
+            if not text or text.endswith(('\n', '\r')):
+                lines += ['']
+            self.assertEqual(len(line_index), len(lines))
+            for index in range(len(text) + 1):
+                with self.subTest(text=text, index=index):
+                    lineno, col_offset = line_index.to_2d(index)
+                    self.assertGreaterEqual(lineno, 1)
+                    self.assertLessEqual(lineno, len(lines))
+                    line = lines[lineno - 1]
+                    self.assertLessEqual(col_offset, len(line))
+                    if col_offset < len(line):
+                        self.assertEqual(line[col_offset], text[index])
+                    self.assertEqual(line_index.to_1d(lineno, col_offset), index)
+            for index in (-1, len(text) + 1):
+                with self.assertRaises(ValueError):
+                    line_index.to_2d(index)
+
+    def test_line_index_newline_starts(self):
+        text = 'abc\r\ndef\rghi\n'
+        with unittest.mock.patch('re.finditer') as mocked:
+            line_index = LineIndex(text, newline_starts=[5, 9, 13])
+        mocked.assert_not_called()
+        self.assertEqual(list(line_index.line_starts), list(LineIndex(text).line_starts))
+        self.assertEqual(LineIndex(text, newline_starts=[5]).to_2d(12), (2, 7))